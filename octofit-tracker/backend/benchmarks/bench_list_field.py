@@ -0,0 +1,37 @@
+"""Per-row cost of ListField.to_representation.
+
+Compares a legacy Python-repr string (the shape rewritten by migration 0005)
+with a native list as stored today.
+
+    python benchmarks/bench_list_field.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from octofit_tracker.serializers import ListField  # noqa: E402
+
+EXERCISES = ['suit donning simulation', 'repulsor aim drills', 'flight stabilization core work']
+ROWS = 100_000
+
+
+def main():
+    field = ListField()
+    cases = {
+        'repr string (before)': repr(EXERCISES),
+        'native list (after)': list(EXERCISES),
+    }
+    for label, value in cases.items():
+        seconds = min(timeit.repeat(lambda: field.to_representation(value), number=ROWS, repeat=3))
+        print(f'{label:<22} {seconds / ROWS * 1e9:10.0f} ns/row')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Per-request CPU of the ORM read path versus the pymongo repository.
+
+Each case builds the response payload of a list page or a detail request
+both ways: through djongo plus the DRF serializer, and through
+``octofit_tracker.repository``. Run against a populated database, e.g.
+
+    python manage.py populate_db --users 1000 --activities-per-user 10
+    python benchmarks/bench_repository.py --page-size 100 --requests 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from octofit_tracker.repository import REPOSITORIES  # noqa: E402
+from octofit_tracker.serializers import (  # noqa: E402
+    UserSerializer, TeamSerializer, ActivitySerializer,
+    LeaderboardSerializer, WorkoutSerializer
+)
+
+SERIALIZERS = {
+    'users': UserSerializer,
+    'teams': TeamSerializer,
+    'activities': ActivitySerializer,
+    'leaderboard': LeaderboardSerializer,
+    'workouts': WorkoutSerializer,
+}
+
+
+def measure(function, requests):
+    """Return (CPU µs, wall µs) per call of ``function``."""
+    function()
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        function()
+    return (
+        (time.process_time() - cpu) / requests * 1e6,
+        (time.perf_counter() - wall) / requests * 1e6,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"case":<24} {"ORM cpu":>10} {"repo cpu":>10} {"ORM wall":>10} {"repo wall":>10} {"speedup":>8}')
+    for resource, serializer_class in SERIALIZERS.items():
+        repository = REPOSITORIES[resource]
+        model = repository.model
+        first = model.objects.mongo_find_one({}, {'_id': 1})
+        if first is None:
+            print(f'{resource:<24} empty collection, skipped')
+            continue
+
+        cases = {
+            f'{resource} list': (
+                lambda: serializer_class(model.objects.order_by('_id')[:args.page_size], many=True).data,
+                lambda: repository.all().order_by('_id')[:args.page_size],
+            ),
+            f'{resource} retrieve': (
+                lambda: serializer_class(model.objects.get(_id=first['_id'])).data,
+                lambda: repository.get(first['_id']),
+            ),
+        }
+        for label, (orm, repo) in cases.items():
+            orm_cpu, orm_wall = measure(orm, args.requests)
+            repo_cpu, repo_wall = measure(repo, args.requests)
+            print(f'{label:<24} {orm_cpu:8.0f}µs {repo_cpu:8.0f}µs {orm_wall:8.0f}µs {repo_wall:8.0f}µs '
+                  f'{orm_cpu / repo_cpu:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""List serialization and JSON rendering throughput on in-memory rows.
+
+Compares DRF's ListSerializer with FastListSerializer for every model
+serializer, and JSONRenderer with ORJSONRenderer when orjson is installed.
+No database is needed.
+
+    python benchmarks/bench_serializers.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from bson import ObjectId  # noqa: E402
+from rest_framework import serializers  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout  # noqa: E402
+from octofit_tracker.renderers import ORJSONRenderer, orjson  # noqa: E402
+from octofit_tracker.serializers import (  # noqa: E402
+    UserSerializer, TeamSerializer, ActivitySerializer,
+    LeaderboardSerializer, WorkoutSerializer
+)
+
+ROW_FACTORIES = {
+    UserSerializer: lambda i: User(
+        _id=ObjectId(), username=f'athlete{i:08d}', name='Alex Smith',
+        email=f'athlete{i:08d}@octofit.test', password='pw'),
+    TeamSerializer: lambda i: Team(_id=ObjectId(), name=f'Team {i}', members=['ironman', 'thor', 'batman']),
+    ActivitySerializer: lambda i: Activity(
+        _id=ObjectId(), username=f'athlete{i:08d}', activity_type='running',
+        duration=float(i % 120), date=date(2024, 1, 1 + i % 28)),
+    LeaderboardSerializer: lambda i: Leaderboard(_id=ObjectId(), username=f'athlete{i:08d}', score=i, calories=i),
+    WorkoutSerializer: lambda i: Workout(
+        _id=ObjectId(), name=f'Workout {i}', description='Intervals',
+        exercises=['sprints', 'burpees', 'planks']),
+}
+
+
+def best(function, repeat=3):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f'{"serializer":<24} {"DRF":>9} {"fast":>9} {"speedup":>8}')
+    for serializer_class, factory in ROW_FACTORIES.items():
+        rows = [factory(i) for i in range(args.rows)]
+        drf = best(lambda: serializers.ListSerializer(rows, child=serializer_class()).data)
+        fast = best(lambda: serializer_class(rows, many=True).data)
+        print(f'{serializer_class.__name__:<24} {drf * 1e3:7.1f}ms {fast * 1e3:7.1f}ms {drf / fast:7.1f}x')
+
+    data = ActivitySerializer([ROW_FACTORIES[ActivitySerializer](i) for i in range(args.rows)], many=True).data
+    stdlib = best(lambda: JSONRenderer().render(data))
+    if orjson is None:
+        print(f'\nJSONRenderer {stdlib * 1e3:.1f}ms; install orjson to compare ORJSONRenderer.')
+        return
+    fast = best(lambda: ORJSONRenderer().render(data))
+    print(f'\n{"renderer":<24} {"stdlib":>9} {"orjson":>9} {"speedup":>8}')
+    print(f'{"activities":<24} {stdlib * 1e3:7.1f}ms {fast * 1e3:7.1f}ms {stdlib / fast:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Concurrent load test of the /api/ endpoints.
+
+Optionally seeds MongoDB at a fixed scale with populate_db, then drives
+every router endpoint of ``octofit_tracker.urls`` (list, detail and the
+extra actions) plus the async mirrors with ``--concurrency`` clients for
+``--duration`` seconds each. It prints, or writes to ``--output``, a JSON
+report with p50/p95/p99 latency in milliseconds and req/s per endpoint.
+Pass ``--baseline`` with an earlier report to print the change.
+
+    python manage.py runserver --noreload &
+    python benchmarks/load_test.py --seed --scale 100k --concurrency 16 --output run.json
+    python benchmarks/load_test.py --baseline run.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+
+from octofit_tracker.urls import router  # noqa: E402
+
+# Scale name -> (users, activities per user).
+SCALES = {
+    '1k': (100, 10),
+    '100k': (10_000, 10),
+    '10m': (100_000, 100),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def fetch(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def endpoints(base_url):
+    """Return ``{name: url}`` for every endpoint worth driving."""
+    urls = {}
+    sample = {}
+    for prefix, _, _ in router.registry:
+        list_url = f'{base_url}/api/{prefix}/'
+        urls[f'{prefix}-list'] = list_url
+        urls[f'async-{prefix}-list'] = f'{base_url}/api/async/{prefix}/'
+        _, body = fetch(list_url + '?page_size=1')
+        results = json.loads(body)['results']
+        if results:
+            sample[prefix] = results[0]
+            urls[f'{prefix}-detail'] = f'{list_url}{results[0]["_id"]}/'
+            urls[f'async-{prefix}-detail'] = f'{base_url}/api/async/{prefix}/{results[0]["_id"]}/'
+    urls['leaderboard-top'] = f'{base_url}/api/leaderboard/top/?n=100'
+    urls['activity-stats'] = f'{base_url}/api/activities/stats/?group_by=activity_type'
+    urls['workouts-sparse'] = f'{base_url}/api/workouts/?fields=name'
+    urls['workouts-search'] = f'{base_url}/api/workouts/search/?q=speed%20int'
+    urls['users-search'] = f'{base_url}/api/users/search/?q=ath'
+    if 'activities' in sample:
+        username = sample['activities']['username']
+        urls['activity-history'] = f'{base_url}/api/activities/?username={username}'
+        urls['leaderboard-rank'] = f'{base_url}/api/leaderboard/rank/{username}/'
+    return urls
+
+
+def drive(url, concurrency, duration):
+    """Hit ``url`` from ``concurrency`` threads for ``duration`` seconds."""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal errors
+        own, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                fetch(url)
+            except (urllib.error.URLError, OSError):
+                failed += 1
+                continue
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+            errors += failed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1e3, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1e3, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1e3, 2) if latencies else None,
+    }
+
+
+def compare(report, baseline):
+    print(f'{"endpoint":<28} {"p95 before":>11} {"p95 after":>10} {"rps before":>11} {"rps after":>10}', file=sys.stderr)
+    for name, after in report['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        print(f'{name:<28} {before["p95_ms"]!s:>11} {after["p95_ms"]!s:>10} '
+              f'{before["rps"]!s:>11} {after["rps"]!s:>10}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', action='store_true', help='Reseed the database at --scale first.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per endpoint.')
+    parser.add_argument('--only', help='Comma-separated endpoint names to drive.')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare against.')
+    args = parser.parse_args()
+
+    if args.seed:
+        users, per_user = SCALES[args.scale]
+        call_command('populate_db', users=users, activities_per_user=per_user, stdout=sys.stderr)
+
+    targets = endpoints(args.base_url.rstrip('/'))
+    if args.only:
+        targets = {name: url for name, url in targets.items() if name in args.only.split(',')}
+
+    report = {
+        'scale': args.scale,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'endpoints': {},
+    }
+    for name, url in targets.items():
+        report['endpoints'][name] = drive(url, args.concurrency, args.duration)
+        print(f'{name}: {report["endpoints"][name]}', file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            compare(report, json.load(handle))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Micro-benchmarks of the per-row and per-request hot spots.
+
+Times ``_parse_list_field`` on every stored shape, list serializer
+throughput, and ``ObjectIdLookupMixin.get_object`` on an object-cache hit
+and miss (skipped when MongoDB is unreachable). Prints a JSON report that can be diffed between runs.
+
+    python benchmarks/micro.py --rows 10000 > micro.json
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from bson import ObjectId  # noqa: E402
+from pymongo.errors import PyMongoError  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from octofit_tracker.models import Activity, User  # noqa: E402
+from octofit_tracker.objectcache import object_cache  # noqa: E402
+from octofit_tracker.serializers import ActivitySerializer, _parse_list_field  # noqa: E402
+from octofit_tracker.views import UserViewSet  # noqa: E402
+
+EXERCISES = ['suit donning simulation', 'repulsor aim drills', 'flight stabilization core work']
+
+
+def per_call(function, number):
+    """Best-of-three nanoseconds per call."""
+    return round(min(timeit.repeat(function, number=number, repeat=3)) / number * 1e9, 1)
+
+
+def parse_list_field(rows):
+    cases = {
+        'native_list': list(EXERCISES),
+        'json_string': json.dumps(EXERCISES),
+        'repr_string': repr(EXERCISES),
+        'malformed_string': 'not a list',
+    }
+    return {name: per_call(lambda: _parse_list_field(value), rows) for name, value in cases.items()}
+
+
+def serializer_throughput(rows):
+    activities = [
+        Activity(_id=ObjectId(), username=f'athlete{i:08d}', activity_type='running',
+                 duration=float(i % 120), date=date(2024, 1, 1 + i % 28))
+        for i in range(rows)
+    ]
+    seconds = min(timeit.repeat(lambda: ActivitySerializer(activities, many=True).data, number=1, repeat=3))
+    return {'rows_per_second': round(rows / seconds)}
+
+
+def get_object(calls):
+    try:
+        user = User.objects.mongo_find_one({}, {'_id': 1})
+    except PyMongoError as exc:
+        return {'skipped': f'MongoDB unreachable: {exc.__class__.__name__}'}
+    if user is None:
+        return {'skipped': 'users collection is empty'}
+    pk = str(user['_id'])
+    view = UserViewSet(action='retrieve', kwargs={'pk': pk}, format_kwarg=None)
+    view.request = Request(APIRequestFactory().get(f'/api/users/{pk}/'))
+    view.get_object()
+
+    def miss():
+        object_cache.clear()
+        return view.get_object()
+
+    return {
+        'hit_ns_per_call': per_call(view.get_object, calls),
+        'miss_ns_per_call': per_call(miss, calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--calls', type=int, default=1000, help='get_object calls per repeat.')
+    args = parser.parse_args()
+
+    print(json.dumps({
+        'parse_list_field_ns': parse_list_field(args.rows),
+        'activity_serializer': serializer_throughput(args.rows),
+        'get_object': get_object(args.calls),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,28 @@
 from django.contrib import admin
-from .models import User, Team, Activity, Leaderboard, Workout
+from .models import User, Team, Activity, Leaderboard, Workout, ActivityDailyRollup
+from . import search
+
+# Changelist searches return at most this many rows.
+ADMIN_SEARCH_LIMIT = 1000
+
+
+class IndexedSearchMixin:
+    """Answer the changelist search from ``search_terms`` instead of regex scans.
+
+    ``search_fields`` still switches the search box on but is not queried.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search.tokenize(search_term):
+            return queryset, False
+        ids = search.matching_ids(self.model, search_term, limit=ADMIN_SEARCH_LIMIT)
+        return queryset.filter(_id__in=ids), False
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('username', 'email')
-    search_fields = ('username', 'email')
+    search_fields = ('username', 'name')
 
 
 @admin.register(Team)
@@ -29,6 +46,12 @@ class LeaderboardAdmin(admin.ModelAdmin):
 
 
 @admin.register(Workout)
-class WorkoutAdmin(admin.ModelAdmin):
+class WorkoutAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('name',)
-    search_fields = ('name',)
+    search_fields = ('name', 'description', 'exercises')
+
+
+@admin.register(ActivityDailyRollup)
+class ActivityDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('username', 'activity_type', 'date', 'total_duration', 'count')
+    list_filter = ('activity_type',)
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+
+
+class OctofitTrackerConfig(AppConfig):
+    name = 'octofit_tracker'
+
+    def ready(self):
+        from pymongo import monitoring
+
+        from . import signals  # noqa: F401
+        from .metrics import command_metrics
+        from .pool import pool_metrics
+
+        # Registered before the first query so every client reports to them.
+        monitoring.register(pool_metrics)
+        monitoring.register(command_metrics)
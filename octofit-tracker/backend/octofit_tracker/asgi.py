@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up; it reaches the models through ranking.
+from .streaming import STREAM_PATH, leaderboard_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Route the live leaderboard stream; everything else goes to Django."""
+    if scope['type'] in ('http', 'websocket') and scope['path'] == STREAM_PATH:
+        await leaderboard_stream(scope, receive, send)
+    elif scope['type'] == 'websocket':
+        await send({'type': 'websocket.close'})
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,120 @@
+"""Native async read endpoints served under ``/api/async/``.
+
+These mirror the list and retrieve actions of the DRF viewsets, including
+the cursor pagination envelope and the serializer field shapes. Writes stay
+on the synchronous DRF viewsets.
+
+They query MongoDB through motor, which is not a non-blocking driver: it
+runs each pymongo call on a ``ThreadPoolExecutor`` shared by the process,
+sized by ``MOTOR_MAX_WORKERS`` (default five per CPU). A request waiting on
+the database keeps the event loop free but occupies one executor thread,
+and once every thread is busy further calls queue for one.
+
+Motor runs each call in a copy of the calling task's context, so the
+``metrics`` request stats reach the command listener in the executor
+thread and these routes report their MongoDB commands like the sync ones.
+"""
+import asyncio
+import weakref
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.utils.urls import replace_query_param
+
+from . import metrics
+from .pagination import ObjectIdCursorPagination
+from .repository import REPOSITORIES
+
+# Motor clients are bound to the event loop they were first used on.
+_clients = weakref.WeakKeyDictionary()
+
+
+def _collection(resource):
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # Imported here so the sync API keeps working where motor is absent.
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(**settings.DATABASES['default']['CLIENT'])
+        _clients[loop] = client
+    model = REPOSITORIES[resource].model
+    return client[settings.DATABASES['default']['NAME']][model._meta.db_table]
+
+
+def _not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+def _decode_cursor(encoded):
+    # Same format as DRF's CursorPagination: base64("p=<_id>").
+    try:
+        querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+        position = parse.parse_qs(querystring, keep_blank_values=True)['p'][0]
+        return ObjectId(position)
+    except (TypeError, ValueError, KeyError, UnicodeError, InvalidId):
+        return None
+
+
+def _encode_cursor(position):
+    return b64encode(parse.urlencode({'p': str(position)}).encode('ascii')).decode('ascii')
+
+
+def _page_size(request):
+    default = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        size = int(request.GET.get(ObjectIdCursorPagination.page_size_query_param, default))
+    except ValueError:
+        return default
+    if size <= 0:
+        return default
+    return min(size, ObjectIdCursorPagination.max_page_size)
+
+
+async def document_list(request, resource):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if resource not in REPOSITORIES:
+        return _not_found()
+    query = {}
+    encoded = request.GET.get(ObjectIdCursorPagination.cursor_query_param)
+    if encoded:
+        position = _decode_cursor(encoded)
+        if position is None:
+            return JsonResponse({'detail': 'Invalid cursor'}, status=404)
+        query['_id'] = {'$gt': position}
+
+    page_size = _page_size(request)
+    repository = REPOSITORIES[resource]
+    documents = await _collection(resource).find(query, repository.projection).sort('_id', 1).to_list(page_size + 1)
+
+    next_link = None
+    if len(documents) > page_size:
+        documents = documents[:page_size]
+        next_link = replace_query_param(
+            request.build_absolute_uri(),
+            ObjectIdCursorPagination.cursor_query_param,
+            _encode_cursor(documents[-1]['_id']),
+        )
+    with metrics.timer('serializer'):
+        results = [repository.to_representation(document) for document in documents]
+    return JsonResponse({'next': next_link, 'previous': None, 'results': results})
+
+
+async def document_detail(request, resource, pk):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if resource not in REPOSITORIES:
+        return _not_found()
+    try:
+        object_id = ObjectId(pk)
+    except (InvalidId, TypeError):
+        return _not_found()
+    repository = REPOSITORIES[resource]
+    document = await _collection(resource).find_one({'_id': object_id}, repository.projection)
+    if document is None:
+        return _not_found()
+    return JsonResponse(repository.encode(document))
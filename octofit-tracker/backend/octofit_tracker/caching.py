@@ -0,0 +1,101 @@
+"""Response caching for read-heavy viewsets.
+
+Serialized list and detail payloads are stored in a Django cache under a key
+made of the collection's generation number, the host and the full path with
+query string. Any write to a collection bumps its generation (see
+``signals.py`` and the leaderboard engine). That orphans every cached
+response for that collection at once without enumerating keys, and works the
+same for local-memory, file and socket-backed cache backends.
+
+Entries keep the ``Last-Modified`` header of the response they were built
+from, so If-Modified-Since is answered from the cache too. Delta-sync
+responses (``?since=``) hold back changes that are still settling and are
+never cached.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+CACHE_ALIAS = 'default'
+
+
+def _generation_key(model):
+    return f'octofit:generation:{model._meta.db_table}'
+
+
+def _generation(model):
+    cache = caches[CACHE_ALIAS]
+    return cache.get_or_set(_generation_key(model), 0, timeout=None)
+
+
+def invalidate(model):
+    """Invalidate every cached response for ``model``'s collection."""
+    cache = caches[CACHE_ALIAS]
+    try:
+        cache.incr(_generation_key(model))
+    except ValueError:
+        cache.set(_generation_key(model), 1, timeout=None)
+
+
+def etag_for(data):
+    payload = json.dumps(data, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+    # Weak: the same data renders differently for JSON and the browsable API.
+    return 'W/"%s"' % hashlib.md5(payload.encode()).hexdigest()
+
+
+def not_modified_since(request, last_modified):
+    """Whether If-Modified-Since shows the client has the ``last_modified`` state.
+
+    ``last_modified`` is a Unix timestamp. The header is ignored when
+    If-None-Match is present, as RFC 9110 requires.
+    """
+    if last_modified is None or 'If-None-Match' in request.headers:
+        return False
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and last_modified <= since
+
+
+class CachedResponseMixin:
+    """Serve ``list`` and ``retrieve`` from the cache with ETag support."""
+
+    cache_timeout = settings.OCTOFIT_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+    def _cache_key(self, request):
+        model = self.queryset.model
+        return f'octofit:response:v2:{model._meta.db_table}:{_generation(model)}:{request.get_host()}{request.get_full_path()}'
+
+    def _cached_response(self, request, build):
+        if 'since' in request.query_params:
+            return build()
+        cache = caches[CACHE_ALIAS]
+        key = self._cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = build()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+            entry = (data, etag_for(data), response.get('Last-Modified'))
+            cache.set(key, entry, self.cache_timeout)
+
+        data, etag, last_modified = entry
+        headers = {'ETag': etag}
+        if last_modified:
+            headers['Last-Modified'] = last_modified
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if (etag in client_etags or '*' in client_etags
+                or not_modified_since(request, last_modified and parse_http_date_safe(last_modified))):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(data, headers=headers)
@@ -0,0 +1,113 @@
+"""In-process change feed for live leaderboard and activity updates.
+
+The leaderboard ranking and the stream poller publish small events to
+``feed``; every open stream (see ``streaming.py``) holds a ``Subscription``
+that buffers them until its client is ready for more. Both sources read
+``change_seq``, so writes made by any process reach every process's
+streams.
+
+Events are dicts with a ``type``:
+
+* ``score``: a user's new ``score``, ``calories`` and ``rank``, with the
+  ``delta`` and ``previous_rank`` since the client last heard about them.
+  Users overtaken by the move shift by one place; clients derive that.
+* ``activity``: a new or changed activity, serialized like the API.
+* ``resync``: the client's view can no longer be patched and should be
+  fetched again, e.g. after ``rebuild_leaderboard``.
+
+A subscription coalesces ``score`` events per user, so a slow client gets
+one event per changed user instead of every intermediate value. Its buffer
+is bounded by ``max_pending``; when a client falls that far behind the
+buffer is dropped and replaced by a single ``resync``. Publishing never
+blocks on a subscriber and costs nothing while nobody is subscribed.
+"""
+import asyncio
+import threading
+from collections import deque
+
+DEFAULT_MAX_PENDING = 1000
+
+
+class Subscription:
+    def __init__(self, loop, max_pending=DEFAULT_MAX_PENDING):
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._activities = deque()
+        self._resync = False
+        self._wakeup = asyncio.Event()
+        self.max_pending = max_pending
+
+    def offer(self, event):
+        """Buffer ``event``; safe to call from any thread."""
+        with self._lock:
+            if self._resync:
+                return
+            if event['type'] == 'score':
+                previous = self._scores.pop(event['username'], None)
+                if previous is not None:
+                    event = dict(
+                        event,
+                        delta=previous['delta'] + event['delta'],
+                        previous_rank=previous['previous_rank'],
+                    )
+                self._scores[event['username']] = event
+            elif event['type'] == 'activity':
+                self._activities.append(event)
+            else:
+                self._resync = True
+            if self._resync or len(self._scores) + len(self._activities) > self.max_pending:
+                self._resync = True
+                self._scores.clear()
+                self._activities.clear()
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # The subscriber's event loop is closed; it is going away.
+            pass
+
+    async def wait(self):
+        await self._wakeup.wait()
+
+    def drain(self):
+        """Return and clear the buffered events, oldest change first."""
+        with self._lock:
+            self._wakeup.clear()
+            if self._resync:
+                self._resync = False
+                return [{'type': 'resync'}]
+            events = list(self._activities) + list(self._scores.values())
+            self._activities.clear()
+            self._scores.clear()
+            return events
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, max_pending=DEFAULT_MAX_PENDING):
+        """Subscribe from a coroutine; events wake the running loop."""
+        subscription = Subscription(asyncio.get_running_loop(), max_pending)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def __bool__(self):
+        return bool(self._subscribers)
+
+    def publish(self, event):
+        if not self._subscribers:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.offer(event)
+
+
+feed = ChangeFeed()
@@ -0,0 +1,204 @@
+"""Change sequence numbers for delta sync and Last-Modified.
+
+Every write to a synced collection stamps the document with ``change_seq``,
+the next value of one global counter, and ``updated_at``. Deletes leave a
+``Tombstone`` with a sequence number of its own. ``?since=<token>`` on the
+list endpoints (see ``views.py``) returns what changed after the token with
+one scan of the ``change_seq`` index, plus the token to send next time;
+``since=0`` pages through everything and is how a client starts.
+
+ORM writes are stamped by the receivers in ``signals.py``. Code writing
+through raw pymongo calls ``stamp``, ``stamp_update`` or ``stamped_updates``.
+
+The ``floor`` is the oldest token that can still be served: pruning
+tombstones or wiping the collections (``populate_db``) raises it, and
+older tokens get 410 Gone so the client starts over from ``since=0``.
+"""
+import heapq
+from datetime import timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+from . import metrics
+from .models import User, Team, Activity, Leaderboard, Workout, SyncCounter, Tombstone
+
+SYNCED_MODELS = (User, Team, Activity, Leaderboard, Workout)
+SEQUENCE = 'change_seq'
+FLOOR = 'floor'
+# A sequence number is reserved before its write lands, so a lower number
+# can still be in flight when a higher one is already visible. Changes
+# younger than this are held back until the next sync.
+SETTLE_SECONDS = 1
+
+
+def _value(name):
+    row = SyncCounter.objects.mongo_find_one({'name': name}, {'value': 1})
+    return row['value'] if row else 0
+
+
+def _utc(value):
+    # pymongo returns naive UTC datetimes.
+    return value.replace(tzinfo=dt_timezone.utc) if timezone.is_naive(value) else value
+
+
+def reserve(count=1):
+    """Atomically reserve ``count`` sequence numbers and return the first."""
+    row = SyncCounter.objects.mongo_find_one_and_update(
+        {'name': SEQUENCE},
+        {'$inc': {'value': count}},
+        projection={'value': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return row['value'] - count + 1
+
+
+def stamp_instance(instance):
+    instance.change_seq = reserve()
+    instance.updated_at = timezone.now()
+
+
+def stamp(documents):
+    """Stamp raw documents that are about to be inserted, in place."""
+    if documents:
+        first = reserve(len(documents))
+        now = timezone.now()
+        for offset, document in enumerate(documents):
+            document['change_seq'] = first + offset
+            document['updated_at'] = now
+    return documents
+
+
+def stamp_update(update, seq=None, now=None):
+    """Return a copy of the update document that also sets the stamps."""
+    stamps = {'change_seq': reserve() if seq is None else seq, 'updated_at': now or timezone.now()}
+    return {**update, '$set': {**update.get('$set', {}), **stamps}}
+
+
+def stamped_updates(operations):
+    """Build ``UpdateOne`` requests from ``(filter, update, upsert)`` triples."""
+    if not operations:
+        return []
+    first = reserve(len(operations))
+    now = timezone.now()
+    return [
+        UpdateOne(query, stamp_update(update, first + offset, now), upsert=upsert)
+        for offset, (query, update, upsert) in enumerate(operations)
+    ]
+
+
+def record_deletion(model, object_id):
+    Tombstone.objects.mongo_insert_one({
+        'collection': model._meta.db_table,
+        'object_id': str(object_id),
+        'change_seq': reserve(),
+        'deleted_at': timezone.now(),
+    })
+
+
+def floor():
+    return _value(FLOOR)
+
+
+def _raise_floor(value):
+    SyncCounter.objects.mongo_update_one({'name': FLOOR}, {'$max': {'value': value}}, upsert=True)
+
+
+def reset():
+    """Expire every token; for when the collections were wiped wholesale."""
+    _raise_floor(reserve())
+    Tombstone.objects.mongo_delete_many({})
+
+
+def prune(before):
+    """Delete tombstones older than ``before``; return how many went."""
+    match = {'deleted_at': {'$lt': before}}
+    newest = list(Tombstone.objects.mongo_aggregate([
+        {'$match': match},
+        {'$group': {'_id': None, 'change_seq': {'$max': '$change_seq'}}},
+    ]))
+    if not newest:
+        return 0
+    # Raise the floor first so no token is served without its deletions.
+    _raise_floor(newest[0]['change_seq'])
+    return Tombstone.objects.mongo_delete_many(match).deleted_count
+
+
+def _settled(changed_at):
+    # None while the change is settling, so clients never validate against
+    # a state that may yet gain a write within the same second.
+    if changed_at is None or changed_at > timezone.now() - timedelta(seconds=SETTLE_SECONDS):
+        return None
+    return changed_at
+
+
+def document_last_modified(document):
+    """When the raw ``document`` last changed, or ``None``; costs no query."""
+    updated_at = document.get('updated_at')
+    return _settled(_utc(updated_at) if updated_at else None)
+
+
+def last_modified(model):
+    """When ``model``'s collection last changed, or ``None``.
+
+    ``None`` is also returned while that change is still settling.
+    """
+    latest = [
+        model.objects.mongo_find_one({}, {'updated_at': 1}, sort=[('change_seq', DESCENDING)]),
+        Tombstone.objects.mongo_find_one(
+            {'collection': model._meta.db_table}, {'deleted_at': 1}, sort=[('change_seq', DESCENDING)]
+        ),
+    ]
+    times = [
+        _utc(row.get('updated_at') or row.get('deleted_at'))
+        for row in latest if row and (row.get('updated_at') or row.get('deleted_at'))
+    ]
+    return _settled(max(times, default=None))
+
+
+def delta(documents, since, limit):
+    """Return up to ``limit`` changes to ``documents`` after token ``since``.
+
+    ``documents`` is a repository ``DocumentQuery``; its filter narrows the
+    changed documents but not the deletions, which only carry an ``_id``.
+    The result holds the encoded ``results``, the ``deleted`` ids, the next
+    ``token`` and whether ``more`` changes are ready right away.
+    """
+    repository = documents.repository
+    changed = repository.model.objects.mongo_find(
+        {**documents.query, 'change_seq': {'$gt': since}},
+        {**repository.projection, 'change_seq': 1, 'updated_at': 1},
+        sort=[('change_seq', ASCENDING)],
+        limit=limit + 1,
+    )
+    # A client syncing from scratch has nothing to delete.
+    tombstones = [] if since == 0 else Tombstone.objects.mongo_find(
+        {'collection': repository.model._meta.db_table, 'change_seq': {'$gt': since}},
+        {'object_id': 1, 'change_seq': 1, 'deleted_at': 1},
+        sort=[('change_seq', ASCENDING)],
+        limit=limit + 1,
+    )
+    merged = heapq.merge(
+        ((document['change_seq'], document.get('updated_at'), document, None) for document in changed),
+        ((tombstone['change_seq'], tombstone['deleted_at'], None, tombstone['object_id']) for tombstone in tombstones),
+        key=lambda change: change[0],
+    )
+
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    results, deleted, token, more = [], [], since, False
+    for seq, changed_at, document, object_id in merged:
+        if changed_at is not None and _utc(changed_at) > settled:
+            break
+        if len(results) + len(deleted) == limit:
+            more = True
+            break
+        if document is None:
+            deleted.append(object_id)
+        else:
+            results.append(document)
+        token = seq
+
+    with metrics.timer('serializer'):
+        results = [repository.to_representation(document) for document in results]
+    return {'results': results, 'deleted': deleted, 'token': str(token), 'more': more}
@@ -0,0 +1,74 @@
+"""Constant-memory activity export.
+
+Rows come straight off a server-side MongoDB cursor with a bounded batch size
+and are encoded by small hand-written encoders instead of the DRF serializer
+stack, so memory stays flat however many activities are exported.
+"""
+import csv
+import io
+import json
+from .models import Activity, to_midnight
+
+EXPORT_FIELDS = ('_id', 'username', 'activity_type', 'duration', 'date')
+BATCH_SIZE = 1000
+
+
+def _row(document):
+    day = document.get('date')
+    return (
+        str(document['_id']),
+        document.get('username'),
+        document.get('activity_type'),
+        document.get('duration'),
+        day.date().isoformat() if day else None,
+    )
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=(',', ':')) + '\n'
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+ENCODERS = {
+    'ndjson': _ndjson_lines,
+    'csv': _csv_lines,
+}
+
+
+def stream_activities(export_format, since=None, batch_size=BATCH_SIZE):
+    """Yield encoded chunks of every activity on or after ``since``.
+
+    One chunk is produced per cursor batch so the response starts flowing as
+    soon as MongoDB returns the first batch.
+    """
+    query = {}
+    if since:
+        query['date'] = {'$gte': to_midnight(since)}
+    cursor = Activity.objects.mongo_find(
+        query,
+        {field: 1 for field in EXPORT_FIELDS},
+        batch_size=batch_size,
+        no_cursor_timeout=True,
+    ).sort('_id', 1)
+    try:
+        chunk = []
+        for line in ENCODERS[export_format](_row(document) for document in cursor):
+            chunk.append(line)
+            if len(chunk) >= batch_size:
+                yield ''.join(chunk).encode()
+                chunk = []
+        if chunk:
+            yield ''.join(chunk).encode()
+    finally:
+        cursor.close()
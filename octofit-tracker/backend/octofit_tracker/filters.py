@@ -0,0 +1,75 @@
+"""Query-string filtering and ordering for the activity list.
+
+Both backends only call ``filter`` and ``order_by``, so they work on the
+repository's ``DocumentQuery`` and become part of the single ``find`` the
+list endpoint issues. Every supported combination is served by one of the
+``Activity.mongo_indexes``; ``ActivityFilterTest`` checks the plans.
+"""
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+def date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Expected a date in YYYY-MM-DD format.'})
+    return parsed
+
+
+class ActivityFilter(BaseFilterBackend):
+    """``?username=``, ``?activity_type=``, ``?date_from=`` and ``?date_to=``."""
+
+    @staticmethod
+    def lookups(request):
+        lookups = {}
+        for name in ('username', 'activity_type'):
+            value = request.query_params.get(name)
+            if value:
+                lookups[name] = value
+        date_from = date_param(request, 'date_from')
+        date_to = date_param(request, 'date_to')
+        if date_from:
+            lookups['date__gte'] = date_from
+        if date_to:
+            lookups['date__lte'] = date_to
+        return lookups
+
+    def filter_queryset(self, request, queryset, view):
+        lookups = self.lookups(request)
+        return queryset.filter(**lookups) if lookups else queryset
+
+
+class HistoryOrderingFilter(OrderingFilter):
+    """``?ordering=`` over ``ordering_fields``, then ``_id``.
+
+    The trailing ``_id`` makes every row's position unique, so the cursor
+    pagination can resume after any row however many share a date or a
+    duration (see ``pagination.py``).
+
+    Filtered lists default to ``view.filtered_ordering`` (newest first), so
+    a per-user history is one range scan of the (username, date, _id)
+    index. Ordering by duration is only indexed per user and therefore
+    requires ``?username=``.
+    """
+
+    def get_default_ordering(self, view):
+        if ActivityFilter.lookups(view.request):
+            return view.filtered_ordering
+        return super().get_default_ordering(view)
+
+    def get_ordering(self, request, queryset, view):
+        # Only the first term is honoured; the indexes cover one sort key.
+        ordering = list(super().get_ordering(request, queryset, view))[:1]
+        field = ordering[0].lstrip('-')
+        if field == 'duration' and not request.query_params.get('username'):
+            raise ValidationError({'ordering': 'Ordering by duration requires ?username=.'})
+        if field != '_id':
+            ordering.append('-_id' if ordering[0].startswith('-') else '_id')
+        return ordering
@@ -0,0 +1,86 @@
+"""Declarative MongoDB index management.
+
+djongo does not apply ``Meta.indexes``, so models declare their secondary
+indexes as a ``mongo_indexes`` list of ``pymongo.IndexModel``. This module
+compares those declarations with what the collection actually has and builds
+whatever is missing.
+"""
+from django.apps import apps
+from pymongo import IndexModel
+
+# Options that change what an index means; anything else (``v``, ``ns``,
+# ``background``) is build-time noise and is ignored when comparing.
+_SIGNIFICANT_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+
+def indexed_models():
+    """Return every octofit model that declares ``mongo_indexes``."""
+    return [
+        model for model in apps.get_app_config('octofit_tracker').get_models()
+        if getattr(model, 'mongo_indexes', None)
+    ]
+
+
+def _spec(document):
+    keys = document['key']
+    keys = tuple(keys.items()) if hasattr(keys, 'items') else tuple(keys)
+    options = tuple(
+        (option, document[option]) for option in _SIGNIFICANT_OPTIONS if document.get(option)
+    )
+    return keys, options
+
+
+def diff_indexes(model):
+    """Compare declared and actual indexes of ``model``'s collection.
+
+    Returns ``(missing, changed, extra)``: declared ``IndexModel`` objects not
+    present at all, declared ``IndexModel`` objects whose name exists with a
+    different definition, and names of undeclared indexes. ``_id_`` and
+    djongo's own ``unique=True`` field indexes are never reported as extra.
+    """
+    actual = model.objects.mongo_index_information()
+    declared = {index.document['name']: index for index in model.mongo_indexes}
+    unique_fields = {field.column for field in model._meta.fields if field.unique}
+
+    missing, changed = [], []
+    for name, index in declared.items():
+        if name not in actual:
+            missing.append(index)
+        elif _spec(actual[name]) != _spec(index.document):
+            changed.append(index)
+
+    extra = []
+    for name, info in actual.items():
+        if name == '_id_' or name in declared:
+            continue
+        keys = _spec(info)[0]
+        if len(keys) == 1 and keys[0][0] in unique_fields:
+            continue
+        extra.append(name)
+    return missing, changed, extra
+
+
+def _background(index):
+    options = {key: value for key, value in index.document.items() if key != 'key'}
+    options['background'] = True
+    return IndexModel(list(index.document['key'].items()), **options)
+
+
+def sync_indexes(model, drop_extra=False):
+    """Bring ``model``'s collection in line with its declarations.
+
+    Missing indexes are built with ``background=True`` so servers older than
+    MongoDB 4.2 do not block reads; newer servers always build that way.
+    Changed indexes are rebuilt. Undeclared indexes are only dropped when
+    ``drop_extra`` is true. Returns the same tuple as ``diff_indexes``.
+    """
+    missing, changed, extra = diff_indexes(model)
+    for index in changed:
+        model.objects.mongo_drop_index(index.document['name'])
+    to_build = [_background(index) for index in missing + changed]
+    if to_build:
+        model.objects.mongo_create_indexes(to_build)
+    if drop_extra:
+        for name in extra:
+            model.objects.mongo_drop_index(name)
+    return missing, changed, extra
@@ -0,0 +1,52 @@
+"""Bulk activity ingestion.
+
+Validated activities are written with unordered ``insert_many`` batches, so
+one bad document only fails itself. The writes bypass model signals, so the
+leaderboard and daily rollups are updated with one summed ``bulk_write``
+each instead of one ``$inc`` per activity.
+"""
+from pymongo.errors import BulkWriteError
+
+from . import caching, changes, leaderboard, rollups
+from .models import Activity, to_midnight
+
+
+def _document(row):
+    return {
+        'username': row['username'],
+        'activity_type': row['activity_type'],
+        'duration': row['duration'],
+        'date': to_midnight(row['date']),
+    }
+
+
+def insert_activities(items, batch_size=1000):
+    """Insert ``(index, validated_data)`` pairs.
+
+    Returns ``(inserted, errors)``: the validated rows that were written and a
+    dict mapping the index of every failed write to its error message.
+    """
+    inserted = []
+    errors = {}
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        failed = {}
+        documents = changes.stamp([_document(row) for _, row in batch])
+        try:
+            Activity.objects.mongo_insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get('writeErrors', []):
+                failed[error['index']] = error.get('errmsg', 'Write failed.')
+        for offset, (index, row) in enumerate(batch):
+            if offset in failed:
+                errors[index] = failed[offset]
+            else:
+                inserted.append(row)
+
+    if inserted:
+        leaderboard.apply_bulk_activities((row['username'], row['duration']) for row in inserted)
+        rollups.apply_bulk_activities(
+            (row['username'], row['activity_type'], row['date'], row['duration']) for row in inserted
+        )
+        caching.invalidate(Activity)
+    return inserted, errors
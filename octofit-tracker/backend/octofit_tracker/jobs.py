@@ -0,0 +1,144 @@
+"""Partitioned job runner for the heavy management commands.
+
+A job splits its work into partitions, such as username ranges or ranges
+of user slots, and runs a task function over each one. With ``workers`` >
+1 the tasks run in a ``ProcessPoolExecutor``. Workers are spawned rather
+than forked. Each one sets Django up afresh with the parent's
+``DATABASES`` (see ``workers.py``), opens its own MongoDB client and
+writes its results with its own bulk writes. Tasks return a count, which
+is used for progress and as the job's result.
+
+The partition plan and the result of every finished partition are
+checkpointed in ``job_checkpoints``. With ``resume=True`` a job reuses the
+stored plan and skips the partitions that already finished. Tasks must
+therefore be idempotent: a partition that was running when the job was
+interrupted runs again. A finished job deletes its checkpoint.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import workers
+from .models import JobCheckpoint
+
+# More partitions than workers evens out skew and makes checkpoints finer.
+PARTITIONS_PER_WORKER = 4
+SAMPLES_PER_PARTITION = 100
+
+
+def partition_count(workers):
+    return 1 if workers <= 1 else workers * PARTITIONS_PER_WORKER
+
+
+def index_ranges(total, partitions):
+    """Split ``range(total)`` into at most ``partitions`` ``[start, stop]`` ranges."""
+    size = max(-(-total // max(partitions, 1)), 1)
+    return [[start, min(start + size, total)] for start in range(0, total, size)]
+
+
+def ranges_from_sample(values, partitions):
+    """Cut the sorted ``values`` into ``[low, high]`` ranges of similar size.
+
+    The first and last ranges are open ended (``None``), so the ranges
+    cover every possible value and not just the sampled ones.
+    """
+    bounds = sorted({values[len(values) * index // partitions] for index in range(1, partitions)}) if values else []
+    edges = [None, *bounds, None]
+    return [[edges[index], edges[index + 1]] for index in range(len(edges) - 1)]
+
+
+def key_ranges(model, field, partitions):
+    """Split ``model``'s collection into ranges of ``field`` using a random sample."""
+    if partitions <= 1:
+        return [[None, None]]
+    sample = model.objects.mongo_aggregate([
+        {'$sample': {'size': partitions * SAMPLES_PER_PARTITION}},
+        {'$project': {field: 1}},
+    ])
+    values = sorted({document[field] for document in sample if document.get(field) is not None})
+    return ranges_from_sample(values, partitions)
+
+
+def range_match(field, partition):
+    """The query for documents whose ``field`` lies in ``[low, high)``."""
+    low, high = partition
+    condition = {}
+    if low is not None:
+        condition['$gte'] = low
+    if high is not None:
+        condition['$lt'] = high
+    return {field: condition} if condition else {}
+
+
+def executor(max_workers):
+    """A pool of spawned worker processes set up like this one."""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=workers.init,
+        initargs=(settings.DATABASES,),
+    )
+
+
+def _start(name, plan, options, resume, stdout):
+    checkpoint = JobCheckpoint.objects.mongo_find_one({'name': name}) if resume else None
+    if checkpoint is not None and checkpoint.get('options') != options:
+        if stdout:
+            stdout.write(f'{name}: ignoring a checkpoint made with other options.')
+        checkpoint = None
+    if checkpoint is not None:
+        if stdout:
+            stdout.write(f"{name}: resuming, {len(checkpoint['results'])}/{len(checkpoint['partitions'])} partitions done.")
+        return checkpoint['partitions'], checkpoint['results']
+    partitions = plan()
+    JobCheckpoint.objects.mongo_replace_one({'name': name}, {
+        'name': name,
+        'options': options,
+        'partitions': partitions,
+        'results': {},
+        'started_at': timezone.now(),
+    }, upsert=True)
+    return partitions, {}
+
+
+def run(name, task, plan, workers=1, resume=False, stdout=None, **options):
+    """Run ``task(partition, **options)`` for every partition ``plan()`` returns.
+
+    ``task`` must be a module-level function and ``options`` plain JSON
+    values, so both can be sent to worker processes and checkpointed.
+    Returns the sum of the tasks' results, including resumed ones.
+    """
+    partitions, results = _start(name, plan, options, resume, stdout)
+    pending = [index for index in range(len(partitions)) if str(index) not in results]
+    total = resumed = sum(results.values())
+    started = time.perf_counter()
+
+    def finished(index, result):
+        nonlocal total
+        total += result
+        results[str(index)] = result
+        JobCheckpoint.objects.mongo_update_one({'name': name}, {'$set': {f'results.{index}': result}})
+        if stdout:
+            elapsed = time.perf_counter() - started
+            rate = (total - resumed) / elapsed if elapsed else 0
+            stdout.write(f'{name}: {len(results)}/{len(partitions)} partitions, {total:,} items ({rate:,.0f}/s).')
+
+    if workers <= 1 or len(pending) <= 1:
+        for index in pending:
+            finished(index, task(partitions[index], **options))
+    else:
+        with executor(min(workers, len(pending))) as pool:
+            futures = {pool.submit(task, partitions[index], **options): index for index in pending}
+            try:
+                for future in as_completed(futures):
+                    finished(futures[future], future.result())
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    JobCheckpoint.objects.mongo_delete_one({'name': name})
+    return total
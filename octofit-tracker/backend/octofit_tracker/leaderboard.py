@@ -0,0 +1,163 @@
+"""Leaderboard engine.
+
+Leaderboard rows are derived from the ``activities`` collection. Every
+Activity write turns into a constant-size ``$inc`` on the owner's row (see
+``signals.py``), so reads of ``/api/leaderboard/`` never have to recompute
+anything. ``rebuild()`` recomputes every row from scratch and is only meant
+for recovery, e.g. after bulk writes that bypass model signals.
+"""
+from pymongo import ReturnDocument
+
+from . import caching, changes, jobs, rollups
+from .changefeed import feed
+from .objectcache import object_cache
+from .models import Activity, ActivityDailyRollup, Leaderboard
+from .ranking import ranking
+
+SCORE_PER_MINUTE = 10
+CALORIES_PER_MINUTE = 8
+
+
+def activity_points(duration):
+    """Return the ``(score, calories)`` contribution of one activity."""
+    duration = duration or 0
+    return round(duration * SCORE_PER_MINUTE), round(duration * CALORIES_PER_MINUTE)
+
+
+def apply_delta(username, score, calories):
+    """Atomically add ``score`` and ``calories`` to ``username``'s row."""
+    if not username or (not score and not calories):
+        return
+    row = Leaderboard.objects.mongo_find_one_and_update(
+        {'username': username},
+        changes.stamp_update({'$inc': {'score': score, 'calories': calories, 'revision': 1}}),
+        projection={'score': 1, 'calories': 1, 'revision': 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    # The revision keeps concurrent deltas in the order they landed; the
+    # ranking also publishes the new score to open streams.
+    ranking.update(username, row.get('score'), row.get('calories'), row.get('revision'))
+    caching.invalidate(Leaderboard)
+    object_cache.invalidate(Leaderboard, row['_id'])
+
+
+def apply_activity_change(old, new):
+    """Move an activity's points from ``old`` to ``new``.
+
+    Both arguments are ``(username, duration)`` tuples or ``None`` for the
+    missing side of a create or delete.
+    """
+    deltas = {}
+    for entry, sign in ((old, -1), (new, 1)):
+        if entry is None:
+            continue
+        username, duration = entry
+        score, calories = activity_points(duration)
+        current = deltas.get(username, (0, 0))
+        deltas[username] = (current[0] + sign * score, current[1] + sign * calories)
+    for username, (score, calories) in deltas.items():
+        apply_delta(username, score, calories)
+
+
+def apply_bulk_activities(entries):
+    """Add many new activities in one ``bulk_write``.
+
+    ``entries`` yields ``(username, duration)`` tuples. Deltas are summed per
+    user first, so a batch costs one write per distinct user.
+    """
+    deltas = {}
+    for username, duration in entries:
+        score, calories = activity_points(duration)
+        current = deltas.get(username, (0, 0))
+        deltas[username] = (current[0] + score, current[1] + calories)
+    if not deltas:
+        return
+    Leaderboard.objects.mongo_bulk_write(changes.stamped_updates([
+        ({'username': username}, {'$inc': {'score': score, 'calories': calories, 'revision': 1}}, True)
+        for username, (score, calories) in deltas.items()
+    ]), ordered=False)
+    rows = Leaderboard.objects.mongo_find(
+        {'username': {'$in': list(deltas)}}, {'username': 1, 'score': 1, 'calories': 1, 'revision': 1}
+    )
+    for row in rows:
+        ranking.update(row['username'], row.get('score'), row.get('calories'), row.get('revision'))
+    caching.invalidate(Leaderboard)
+    object_cache.invalidate(Leaderboard)
+
+
+def points_expression(per_minute):
+    """``$sum`` of per-activity rounded points, matching ``activity_points``."""
+    return {'$sum': {'$round': [{'$multiply': [{'$ifNull': ['$duration', 0]}, per_minute]}, 0]}}
+
+
+def rebuild(batch_size=1000, workers=1, resume=False, stdout=None):
+    """Recompute every leaderboard row with streaming aggregations.
+
+    The aggregation reads the daily rollups when they cover the whole history
+    and the raw activities otherwise. With ``workers`` > 1 the usernames are
+    split into ranges that are rebuilt in parallel processes; see
+    ``jobs.py``. Returns the number of users with at least one activity.
+    Rows belonging to users without activities are reset to zero rather
+    than deleted.
+    """
+    use_rollups = rollups.covers(None)
+    source = ActivityDailyRollup if use_rollups else Activity
+    users = jobs.run(
+        'rebuild_leaderboard', rebuild_range,
+        lambda: jobs.key_ranges(source, 'username', jobs.partition_count(workers)),
+        workers=workers, resume=resume, stdout=stdout,
+        batch_size=batch_size, use_rollups=use_rollups,
+    )
+    ranking.invalidate()
+    caching.invalidate(Leaderboard)
+    object_cache.invalidate(Leaderboard)
+    feed.publish({'type': 'resync'})
+    return users
+
+
+def rebuild_range(partition, batch_size, use_rollups):
+    """Recompute the rows of the usernames in ``partition``; a ``jobs`` task."""
+    match = jobs.range_match('username', partition)
+    if use_rollups:
+        source = ActivityDailyRollup
+        group = {'_id': '$username', 'score': {'$sum': '$score'}, 'calories': {'$sum': '$calories'}}
+    else:
+        source = Activity
+        group = {
+            '_id': '$username',
+            'score': points_expression(SCORE_PER_MINUTE),
+            'calories': points_expression(CALORIES_PER_MINUTE),
+        }
+    cursor = source.objects.mongo_aggregate(
+        [{'$match': match}, {'$group': group}], allowDiskUse=True, batchSize=batch_size
+    )
+    seen = set()
+    operations = []
+    for row in cursor:
+        seen.add(row['_id'])
+        operations.append((
+            {'username': row['_id']},
+            {'$set': {'score': int(row['score']), 'calories': int(row['calories'])}, '$inc': {'revision': 1}},
+            True,
+        ))
+        if len(operations) >= batch_size:
+            Leaderboard.objects.mongo_bulk_write(changes.stamped_updates(operations), ordered=False)
+            operations = []
+
+    stale = Leaderboard.objects.mongo_find(match, {'username': 1}, batch_size=batch_size)
+    for row in stale:
+        if row.get('username') in seen:
+            continue
+        operations.append((
+            {'_id': row['_id']},
+            {'$set': {'score': 0, 'calories': 0}, '$inc': {'revision': 1}},
+            False,
+        ))
+        if len(operations) >= batch_size:
+            Leaderboard.objects.mongo_bulk_write(changes.stamped_updates(operations), ordered=False)
+            operations = []
+
+    if operations:
+        Leaderboard.objects.mongo_bulk_write(changes.stamped_updates(operations), ordered=False)
+    return len(seen)
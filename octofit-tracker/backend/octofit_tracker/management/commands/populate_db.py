@@ -1,124 +1,222 @@
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
+
 from django.core.management.base import BaseCommand
-from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout
-from datetime import date
+from octofit_tracker import changes, jobs, leaderboard, rollups, search
+from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout, to_midnight
+
+# Superheroes always fill the first user slots so the default run reproduces
+# the original workshop data.
+HEROES = [
+    {'username': 'ironman',        'name': 'Tony Stark',       'email': 'tony@stark.com',          'password': 'pepper123'},
+    {'username': 'spiderman',      'name': 'Peter Parker',     'email': 'peter@parker.com',         'password': 'webslinger'},
+    {'username': 'captainamerica', 'name': 'Steve Rogers',     'email': 'steve@rogers.com',         'password': 'shield123'},
+    {'username': 'thor',           'name': 'Thor Odinson',     'email': 'thor@asgard.com',          'password': 'mjolnir99'},
+    {'username': 'blackwidow',     'name': 'Natasha Romanoff', 'email': 'natasha@shield.com',       'password': 'spy007'},
+    {'username': 'batman',         'name': 'Bruce Wayne',      'email': 'bruce@wayne.com',          'password': 'alfred123'},
+    {'username': 'superman',       'name': 'Clark Kent',       'email': 'clark@kent.com',           'password': 'krypton1'},
+    {'username': 'wonderwoman',    'name': 'Diana Prince',     'email': 'diana@themyscira.com',     'password': 'lasso42'},
+    {'username': 'theflash',       'name': 'Barry Allen',      'email': 'barry@allen.com',          'password': 'speedforce'},
+    {'username': 'aquaman',        'name': 'Arthur Curry',     'email': 'arthur@atlantis.com',      'password': 'trident9'},
+]
+
+# The first activity of each hero.
+HERO_ACTIVITIES = {
+    'ironman':        ('flight training', 45.0, date(2024, 1, 10)),
+    'spiderman':      ('web swinging', 30.0, date(2024, 1, 11)),
+    'captainamerica': ('shield throwing', 60.0, date(2024, 1, 12)),
+    'thor':           ('hammer lifting', 50.0, date(2024, 1, 13)),
+    'blackwidow':     ('martial arts', 40.0, date(2024, 1, 14)),
+    'batman':         ('cape gliding', 35.0, date(2024, 1, 10)),
+    'superman':       ('flying', 55.0, date(2024, 1, 11)),
+    'wonderwoman':    ('lasso training', 45.0, date(2024, 1, 12)),
+    'theflash':       ('speed running', 20.0, date(2024, 1, 13)),
+    'aquaman':        ('swimming', 60.0, date(2024, 1, 14)),
+}
+
+TEAMS = [
+    {'name': 'Team Marvel', 'members': ['ironman', 'spiderman', 'captainamerica', 'thor', 'blackwidow']},
+    {'name': 'Team DC', 'members': ['batman', 'superman', 'wonderwoman', 'theflash', 'aquaman']},
+]
+
+WORKOUTS = [
+    {
+        'name': 'Stark Iron Conditioning',
+        'description': 'High-intensity suit-inspired workout for endurance and strength.',
+        'exercises': ['suit donning simulation', 'repulsor aim drills', 'flight stabilization core work'],
+    },
+    {
+        'name': 'Spider Agility Circuit',
+        'description': 'Agility and reflexes training inspired by your friendly neighborhood hero.',
+        'exercises': ['wall crawl simulation', 'quick-reflexes dodging', 'web cast precision throws'],
+    },
+    {
+        'name': 'Shield Warrior Training',
+        'description': 'Full-body strength and endurance program fit for a super-soldier.',
+        'exercises': ['shield block drills', 'tactical sprints', 'super-soldier press'],
+    },
+    {
+        'name': 'Gotham Night Patrol',
+        'description': 'Stealth and strength training for the Dark Knight.',
+        'exercises': ['grappling hook pull-ups', 'silent movement drills', 'batarang accuracy throws'],
+    },
+    {
+        'name': 'Speed Force Intervals',
+        'description': 'Lightning-fast interval training for maximum speed and recovery.',
+        'exercises': ['rapid interval sprints', 'lightning reflex drills', 'speed force meditation'],
+    },
+]
+
+ACTIVITY_TYPES = [
+    'running', 'cycling', 'swimming', 'strength training', 'yoga', 'hiking',
+    'rowing', 'martial arts', 'walking', 'climbing',
+]
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Silva', 'Novak', 'Khan', 'Larsen', 'Rossi', 'Tanaka']
+HISTORY_DAYS = 365
+HISTORY_END = date(2024, 12, 31)
+
+
+def user_document(index, seed):
+    """Return the user stored in slot ``index``; heroes fill the first slots."""
+    if index < len(HEROES):
+        return dict(HEROES[index])
+    rng = random.Random(f'{seed}:user:{index}')
+    username = f'athlete{index:08d}'
+    return {
+        'username': username,
+        'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'email': f'{username}@octofit.test',
+        'password': f'pw{rng.getrandbits(32):08x}',
+    }
+
+
+def activity_documents(index, username, per_user, seed):
+    """Yield ``per_user`` activities for the user in slot ``index``."""
+    rng = random.Random(f'{seed}:activities:{index}')
+    for n in range(per_user):
+        if n == 0 and username in HERO_ACTIVITIES:
+            activity_type, duration, day = HERO_ACTIVITIES[username]
+        else:
+            activity_type = rng.choice(ACTIVITY_TYPES)
+            duration = float(rng.randint(10, 120))
+            day = HISTORY_END - timedelta(days=rng.randrange(HISTORY_DAYS))
+        yield {
+            'username': username,
+            'activity_type': activity_type,
+            'duration': duration,
+            'date': to_midnight(day),
+        }
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def insert_user_range(partition, seed, per_user, chunk_size):
+    """Insert the users in slots ``[start, stop)`` and their activities.
+
+    A ``jobs`` task; returns the number of documents written.
+    """
+    start, stop = partition
+    written = 0
+    for indexes in chunked(range(start, stop), chunk_size):
+        users = [user_document(index, seed) for index in indexes]
+        usernames = [user['username'] for user in users]
+        # A resumed run may have written part of this range already.
+        User.objects.mongo_delete_many({'username': {'$in': usernames}})
+        Activity.objects.mongo_delete_many({'username': {'$in': usernames}})
+        User.objects.mongo_insert_many(changes.stamp(search.index_documents(User, users)), ordered=False)
+        written += len(users)
+        activities = (
+            activity
+            for index, username in zip(indexes, usernames)
+            for activity in activity_documents(index, username, per_user, seed)
+        )
+        for chunk in chunked(activities, chunk_size):
+            Activity.objects.mongo_insert_many(changes.stamp(chunk), ordered=False)
+            written += len(chunk)
+    return written
 
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
-    def handle(self, *args, **kwargs):
-        # Delete existing data
-        User.objects.all().delete()
-        Team.objects.all().delete()
-        Activity.objects.all().delete()
-        Leaderboard.objects.all().delete()
-        Workout.objects.all().delete()
-
-        self.stdout.write('Deleted existing data.')
-
-        # Create Users (superheroes)
-        users_data = [
-            {'username': 'ironman',        'name': 'Tony Stark',       'email': 'tony@stark.com',          'password': 'pepper123'},
-            {'username': 'spiderman',      'name': 'Peter Parker',     'email': 'peter@parker.com',         'password': 'webslinger'},
-            {'username': 'captainamerica', 'name': 'Steve Rogers',     'email': 'steve@rogers.com',         'password': 'shield123'},
-            {'username': 'thor',           'name': 'Thor Odinson',     'email': 'thor@asgard.com',          'password': 'mjolnir99'},
-            {'username': 'blackwidow',     'name': 'Natasha Romanoff', 'email': 'natasha@shield.com',       'password': 'spy007'},
-            {'username': 'batman',         'name': 'Bruce Wayne',      'email': 'bruce@wayne.com',          'password': 'alfred123'},
-            {'username': 'superman',       'name': 'Clark Kent',       'email': 'clark@kent.com',           'password': 'krypton1'},
-            {'username': 'wonderwoman',    'name': 'Diana Prince',     'email': 'diana@themyscira.com',     'password': 'lasso42'},
-            {'username': 'theflash',       'name': 'Barry Allen',      'email': 'barry@allen.com',          'password': 'speedforce'},
-            {'username': 'aquaman',        'name': 'Arthur Curry',     'email': 'arthur@atlantis.com',      'password': 'trident9'},
-        ]
-        users = []
-        for data in users_data:
-            user = User(**data)
-            user.save()
-            users.append(user)
-
-        self.stdout.write(f'Created {len(users)} users.')
-
-        # Create Teams
-        marvel_members = [u.username for u in users if u.username in ['ironman', 'spiderman', 'captainamerica', 'thor', 'blackwidow']]
-        dc_members = [u.username for u in users if u.username in ['batman', 'superman', 'wonderwoman', 'theflash', 'aquaman']]
-
-        team_marvel = Team(name='Team Marvel', members=marvel_members)
-        team_marvel.save()
-
-        team_dc = Team(name='Team DC', members=dc_members)
-        team_dc.save()
-
-        self.stdout.write('Created 2 teams: Team Marvel and Team DC.')
-
-        # Create Activities
-        activities_data = [
-            {'username': 'ironman', 'activity_type': 'flight training', 'duration': 45.0, 'date': date(2024, 1, 10)},
-            {'username': 'spiderman', 'activity_type': 'web swinging', 'duration': 30.0, 'date': date(2024, 1, 11)},
-            {'username': 'captainamerica', 'activity_type': 'shield throwing', 'duration': 60.0, 'date': date(2024, 1, 12)},
-            {'username': 'thor', 'activity_type': 'hammer lifting', 'duration': 50.0, 'date': date(2024, 1, 13)},
-            {'username': 'blackwidow', 'activity_type': 'martial arts', 'duration': 40.0, 'date': date(2024, 1, 14)},
-            {'username': 'batman', 'activity_type': 'cape gliding', 'duration': 35.0, 'date': date(2024, 1, 10)},
-            {'username': 'superman', 'activity_type': 'flying', 'duration': 55.0, 'date': date(2024, 1, 11)},
-            {'username': 'wonderwoman', 'activity_type': 'lasso training', 'duration': 45.0, 'date': date(2024, 1, 12)},
-            {'username': 'theflash', 'activity_type': 'speed running', 'duration': 20.0, 'date': date(2024, 1, 13)},
-            {'username': 'aquaman', 'activity_type': 'swimming', 'duration': 60.0, 'date': date(2024, 1, 14)},
-        ]
-        for data in activities_data:
-            activity = Activity(**data)
-            activity.save()
-
-        self.stdout.write(f'Created {len(activities_data)} activities.')
-
-        # Create Leaderboard
-        leaderboard_data = [
-            {'username': 'ironman',        'score': 950, 'calories': 450},
-            {'username': 'spiderman',      'score': 880, 'calories': 390},
-            {'username': 'captainamerica', 'score': 920, 'calories': 520},
-            {'username': 'thor',           'score': 870, 'calories': 480},
-            {'username': 'blackwidow',     'score': 860, 'calories': 430},
-            {'username': 'batman',         'score': 940, 'calories': 400},
-            {'username': 'superman',       'score': 990, 'calories': 510},
-            {'username': 'wonderwoman',    'score': 910, 'calories': 440},
-            {'username': 'theflash',       'score': 850, 'calories': 350},
-            {'username': 'aquaman',        'score': 830, 'calories': 470},
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=len(HEROES),
+                            help='Total number of users; the first ten are superheroes.')
+        parser.add_argument('--activities-per-user', type=int, default=1)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Documents per insert_many call.')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes, each inserting a range of users.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted run instead of starting over.')
+
+    def insert(self, model, documents, chunk_size):
+        """Stream ``documents`` into ``model``'s collection and report docs/s."""
+        started = time.perf_counter()
+        total = 0
+        for chunk in chunked(documents, chunk_size):
+            model.objects.mongo_insert_many(changes.stamp(chunk), ordered=False)
+            total += len(chunk)
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f'Created {total} {model._meta.db_table} in {elapsed:.2f}s ({rate:,.0f} docs/s).')
+        return total
+
+    def handle(self, *args, **options):
+        users = options['users']
+        per_user = options['activities_per_user']
+        seed = options['seed']
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        resume = options['resume']
+
+        if not resume:
+            # Delete existing data without loading it into Python.
+            for model in (User, Team, Activity, Leaderboard, Workout):
+                model.objects.mongo_delete_many({})
+            rollups.clear()
+            # Nothing recorded these deletions, so every sync token is void.
+            changes.reset()
+            self.stdout.write('Deleted existing data.')
+
+        started = time.perf_counter()
+        total = jobs.run(
+            'populate_db', insert_user_range,
+            lambda: jobs.index_ranges(users, jobs.partition_count(workers)),
+            workers=workers, resume=resume, stdout=self.stdout,
+            seed=seed, per_user=per_user, chunk_size=chunk_size,
+        )
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f'Created {users} users and their activities in {elapsed:.2f}s ({rate:,.0f} docs/s).')
+
+        usernames = {hero['username'] for hero in HEROES[:users]}
+        teams = [
+            {'name': team['name'], 'members': [m for m in team['members'] if m in usernames]}
+            for team in TEAMS
         ]
-        for data in leaderboard_data:
-            entry = Leaderboard(**data)
-            entry.save()
-
-        self.stdout.write(f'Created {len(leaderboard_data)} leaderboard entries.')
-
-        # Create Workouts
-        workouts_data = [
-            {
-                'name': 'Stark Iron Conditioning',
-                'description': 'High-intensity suit-inspired workout for endurance and strength.',
-                'exercises': ['suit donning simulation', 'repulsor aim drills', 'flight stabilization core work'],
-            },
-            {
-                'name': 'Spider Agility Circuit',
-                'description': 'Agility and reflexes training inspired by your friendly neighborhood hero.',
-                'exercises': ['wall crawl simulation', 'quick-reflexes dodging', 'web cast precision throws'],
-            },
-            {
-                'name': 'Shield Warrior Training',
-                'description': 'Full-body strength and endurance program fit for a super-soldier.',
-                'exercises': ['shield block drills', 'tactical sprints', 'super-soldier press'],
-            },
-            {
-                'name': 'Gotham Night Patrol',
-                'description': 'Stealth and strength training for the Dark Knight.',
-                'exercises': ['grappling hook pull-ups', 'silent movement drills', 'batarang accuracy throws'],
-            },
-            {
-                'name': 'Speed Force Intervals',
-                'description': 'Lightning-fast interval training for maximum speed and recovery.',
-                'exercises': ['rapid interval sprints', 'lightning reflex drills', 'speed force meditation'],
-            },
-        ]
-        for data in workouts_data:
-            workout = Workout(**data)
-            workout.save()
-
-        self.stdout.write(f'Created {len(workouts_data)} workouts.')
+        Team.objects.mongo_delete_many({})
+        self.insert(Team, teams, chunk_size)
+
+        # insert_many bypasses the Activity signals, so derive the rollups and
+        # the leaderboard with one aggregation each instead.
+        written = rollups.refresh(batch_size=chunk_size, workers=workers, resume=resume, stdout=self.stdout)
+        self.stdout.write(f'Wrote {written} daily rollups.')
+        ranked = leaderboard.rebuild(batch_size=chunk_size, workers=workers, resume=resume, stdout=self.stdout)
+        self.stdout.write(f'Leaderboard has {ranked} entries.')
+
+        Workout.objects.mongo_delete_many({})
+        self.insert(Workout, search.index_documents(Workout, [dict(workout) for workout in WORKOUTS]), chunk_size)
 
         self.stdout.write(self.style.SUCCESS('Database populated successfully with superhero test data!'))
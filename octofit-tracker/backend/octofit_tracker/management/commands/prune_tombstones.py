@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from octofit_tracker import changes
+
+
+class Command(BaseCommand):
+    help = 'Delete old delta-sync tombstones; clients with older tokens resync from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Keep tombstones younger than this many days.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative.')
+        pruned = changes.prune(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {pruned} tombstones; tokens below {changes.floor()} have expired.'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute every leaderboard row from the activities collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes, each rebuilding a range of usernames.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted run from its checkpoint.')
+
+    def handle(self, *args, **options):
+        users = leaderboard.rebuild(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            resume=options['resume'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboard for {users} users.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from octofit_tracker import rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill the daily activity rollups from the activities collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild days on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes, each refreshing a range of usernames.')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted run from its checkpoint.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format.')
+        written = rollups.refresh(
+            since=since,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            resume=options['resume'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} rollups; covered from {rollups.covered_from()}.'
+        ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker import indexes
+
+
+class Command(BaseCommand):
+    help = 'Create the MongoDB indexes declared on octofit models and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drift; exit with an error if any is found.',
+        )
+        parser.add_argument(
+            '--drop-extra', action='store_true',
+            help='Drop indexes that exist in MongoDB but are not declared.',
+        )
+
+    def handle(self, *args, **options):
+        drift = False
+        for model in indexes.indexed_models():
+            collection = model._meta.db_table
+            if options['check']:
+                missing, changed, extra = indexes.diff_indexes(model)
+            else:
+                missing, changed, extra = indexes.sync_indexes(model, drop_extra=options['drop_extra'])
+
+            for index in missing:
+                self.stdout.write(f"{collection}: missing {index.document['name']}")
+            for index in changed:
+                self.stdout.write(f"{collection}: changed {index.document['name']}")
+            for name in extra:
+                self.stdout.write(f'{collection}: undeclared {name}')
+            drift = drift or bool(missing or changed or extra)
+
+        if options['check']:
+            if drift:
+                raise CommandError('Declared and actual indexes differ.')
+            self.stdout.write(self.style.SUCCESS('Indexes are in sync.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Indexes synced.'))
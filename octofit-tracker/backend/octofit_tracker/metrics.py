@@ -0,0 +1,224 @@
+"""Per-endpoint request instrumentation.
+
+``MetricsMiddleware`` times every request and, through a pymongo command
+listener and the serializers' ``.data`` hook, attributes the number of
+MongoDB commands, the time spent in them and the time spent serializing to
+the route that caused them. Everything is kept in in-process histograms and
+exposed in the Prometheus text format by the ``/metrics`` view, together
+with the connection pool and hot-object cache counters.
+
+Set ``OCTOFIT_SLOW_REQUEST_MS`` to log requests slower than that threshold
+together with the MongoDB commands they issued.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse
+from pymongo import monitoring
+
+from .objectcache import object_cache
+from .pool import pool_metrics
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+# Longest command text kept for the slow-request log.
+MAX_COMMAND_CHARS = 500
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yield ``(upper_bound, cumulative_count)`` including ``+Inf``."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class RequestStats:
+    def __init__(self, capture_commands):
+        self.db_commands = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.commands = [] if capture_commands else None
+
+
+_current = contextvars.ContextVar('octofit_request_stats', default=None)
+
+
+@contextmanager
+def timer(kind):
+    """Add the time spent in the block to the current request's ``kind``."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(stats, f'{kind}_seconds', getattr(stats, f'{kind}_seconds') + time.perf_counter() - started)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Charges MongoDB commands to the request that issued them."""
+
+    def started(self, event):
+        stats = _current.get()
+        if stats is not None and stats.commands is not None:
+            text = json.dumps(event.command, default=str)[:MAX_COMMAND_CHARS]
+            stats.commands.append(f'{event.database_name}.{event.command_name} {text}')
+
+    def _finished(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.db_commands += 1
+            stats.db_seconds += event.duration_micros / 1e6
+
+    succeeded = _finished
+    failed = _finished
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._requests = {}
+
+    def record(self, route, method, status_code, wall_seconds, stats):
+        key = (route, method)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    'request_duration_seconds': Histogram(DURATION_BUCKETS),
+                    'db_duration_seconds': Histogram(DURATION_BUCKETS),
+                    'db_commands': Histogram(COUNT_BUCKETS),
+                    'serializer_duration_seconds': Histogram(DURATION_BUCKETS),
+                }
+            series['request_duration_seconds'].observe(wall_seconds)
+            series['db_duration_seconds'].observe(stats.db_seconds)
+            series['db_commands'].observe(stats.db_commands)
+            series['serializer_duration_seconds'].observe(stats.serializer_seconds)
+            status_key = (route, method, status_code)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+
+    def exposition(self):
+        """Render every metric in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP octofit_requests_total Requests by route, method and status.',
+                '# TYPE octofit_requests_total counter',
+            ]
+            for (route, method, code), value in sorted(self._requests.items()):
+                lines.append(f'octofit_requests_total{{route="{route}",method="{method}",status="{code}"}} {value}')
+            for name in ('request_duration_seconds', 'db_duration_seconds', 'db_commands', 'serializer_duration_seconds'):
+                lines += [f'# TYPE octofit_{name} histogram']
+                for (route, method), series in sorted(self._series.items()):
+                    histogram = series[name]
+                    labels = f'route="{route}",method="{method}"'
+                    for bound, count in histogram.cumulative():
+                        le = '+Inf' if bound == float('inf') else repr(float(bound))
+                        lines.append(f'octofit_{name}_bucket{{{labels},le="{le}"}} {count}')
+                    lines.append(f'octofit_{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'octofit_{name}_count{{{labels}}} {histogram.count}')
+
+        pools = pool_metrics.snapshot()
+        for field in ('max_pool_size', 'open', 'in_use', 'peak_in_use', 'checkouts', 'wait_seconds_total', 'timeouts'):
+            lines.append(f'# TYPE octofit_mongo_pool_{field} gauge')
+            for address, stats in sorted(pools.items()):
+                if stats[field] is None:
+                    continue
+                lines.append(f'octofit_mongo_pool_{field}{{address="{address}"}} {stats[field]}')
+
+        objects = object_cache.snapshot()
+        for field in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+            lines.append(f'# TYPE octofit_object_cache_{field}_total counter')
+            for collection, stats in objects.items():
+                lines.append(f'octofit_object_cache_{field}_total{{collection="{collection}"}} {stats[field]}')
+        lines.append('# TYPE octofit_object_cache_size gauge')
+        for collection, stats in objects.items():
+            lines.append(f'octofit_object_cache_size{{collection="{collection}"}} {stats["size"]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+command_metrics = CommandMetrics()
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = None
+        if settings.OCTOFIT_SLOW_REQUEST_MS is not None:
+            self.slow_seconds = settings.OCTOFIT_SLOW_REQUEST_MS / 1000
+        if asyncio.iscoroutinefunction(self.get_response):
+            # Mark the instance as a coroutine function, as Django's
+            # MiddlewareMixin does, so async views skip the thread hop.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def _start(self):
+        stats = RequestStats(capture_commands=self.slow_seconds is not None)
+        return stats, _current.set(stats), time.perf_counter()
+
+    def _finish(self, request, response, stats, token, started):
+        wall = time.perf_counter() - started
+        _current.reset(token)
+        route = _route(request)
+        registry.record(route, request.method, response.status_code, wall, stats)
+        if self.slow_seconds is not None and wall >= self.slow_seconds:
+            logger.warning(
+                'Slow request %s %s (%s): %.1fms, %d Mongo commands in %.1fms, serializer %.1fms\n%s',
+                request.method, request.get_full_path(), route, wall * 1000,
+                stats.db_commands, stats.db_seconds * 1000, stats.serializer_seconds * 1000,
+                '\n'.join(stats.commands),
+            )
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        response = self.get_response(request)
+        return self._finish(request, response, stats, token, started)
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        response = await self.get_response(request)
+        return self._finish(request, response, stats, token, started)
+
+
+def metrics_view(request):
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
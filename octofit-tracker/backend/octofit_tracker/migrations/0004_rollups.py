@@ -0,0 +1,39 @@
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0003_user_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityDailyRollup',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('username', models.CharField(max_length=100)),
+                ('activity_type', models.CharField(max_length=100)),
+                ('date', models.DateField()),
+                ('total_duration', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('score', models.IntegerField(default=0)),
+                ('calories', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'activity_daily_rollups',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupCoverage',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('covered_from', models.DateField()),
+            ],
+            options={
+                'db_table': 'rollup_coverage',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+import ast
+import json
+
+from django.db import migrations
+from pymongo import UpdateOne
+
+LIST_FIELDS = {
+    'teams': 'members',
+    'workouts': 'exercises',
+}
+
+
+def _as_list(value):
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def rewrite_string_lists(apps, schema_editor):
+    """Store list fields saved as Python-repr strings as native BSON arrays."""
+    db = schema_editor.connection.cursor().db_conn
+    for table, field in LIST_FIELDS.items():
+        collection = db[table]
+        operations = []
+        for document in collection.find({field: {'$type': 'string'}}, {field: 1}):
+            operations.append(UpdateOne(
+                {'_id': document['_id']},
+                {'$set': {field: _as_list(document[field])}},
+            ))
+            if len(operations) >= 1000:
+                collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0004_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(rewrite_string_lists, migrations.RunPython.noop),
+    ]
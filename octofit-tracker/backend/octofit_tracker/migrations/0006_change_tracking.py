@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+import djongo.models.fields
+from pymongo import UpdateOne
+
+SYNCED_TABLES = ('users', 'teams', 'activities', 'leaderboard', 'workouts')
+
+
+def stamp_existing_documents(apps, schema_editor):
+    """Give every existing document a change_seq, continuing the counter."""
+    db = schema_editor.connection.cursor().db_conn
+    counter = db['sync_counters'].find_one({'name': 'change_seq'})
+    seq = counter['value'] if counter else 0
+    now = datetime.now(timezone.utc)
+    for table in SYNCED_TABLES:
+        collection = db[table]
+        operations = []
+        for document in collection.find({'change_seq': None}, {'_id': 1}).sort('_id', 1):
+            seq += 1
+            operations.append(UpdateOne(
+                {'_id': document['_id']},
+                {'$set': {'change_seq': seq, 'updated_at': now}},
+            ))
+            if len(operations) >= 1000:
+                collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+    db['sync_counters'].update_one({'name': 'change_seq'}, {'$set': {'value': seq}}, upsert=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0005_list_fields_as_arrays'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCounter',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'sync_counters',
+            },
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('collection', models.CharField(max_length=100)),
+                ('object_id', models.CharField(max_length=24)),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'tombstones',
+            },
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='change_seq',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='leaderboard',
+            name='change_seq',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='leaderboard',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='change_seq',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='change_seq',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='change_seq',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(stamp_existing_documents, migrations.RunPython.noop),
+    ]
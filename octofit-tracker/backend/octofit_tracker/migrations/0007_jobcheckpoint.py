@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0006_change_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('_id', djongo.models.fields.ObjectIdField(auto_created=True, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('options', djongo.models.fields.JSONField(default=dict)),
+                ('partitions', djongo.models.fields.JSONField(default=list)),
+                ('results', djongo.models.fields.JSONField(default=dict)),
+                ('started_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'job_checkpoints',
+            },
+        ),
+    ]
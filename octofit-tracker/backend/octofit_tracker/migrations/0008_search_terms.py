@@ -0,0 +1,63 @@
+import re
+import unicodedata
+
+from django.db import migrations
+import djongo.models.fields
+from pymongo import UpdateOne
+
+SEARCH_FIELDS = {
+    'users': ('username', 'name'),
+    'workouts': ('name', 'description', 'exercises'),
+}
+
+_WORD = re.compile(r'\w+')
+
+
+def _tokenize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    return _WORD.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def index_existing_documents(apps, schema_editor):
+    """Compute search_terms for every user and workout."""
+    db = schema_editor.connection.cursor().db_conn
+    for table, fields in SEARCH_FIELDS.items():
+        collection = db[table]
+        operations = []
+        for document in collection.find({}, dict.fromkeys(fields, 1)):
+            words = set()
+            for field in fields:
+                value = document.get(field)
+                for text in value if isinstance(value, list) else [value]:
+                    if isinstance(text, str):
+                        words.update(_tokenize(text))
+            operations.append(UpdateOne(
+                {'_id': document['_id']},
+                {'$set': {'search_terms': sorted(words)}},
+            ))
+            if len(operations) >= 1000:
+                collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0007_jobcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search_terms',
+            field=djongo.models.fields.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='search_terms',
+            field=djongo.models.fields.JSONField(default=list, editable=False),
+        ),
+        migrations.RunPython(index_existing_documents, migrations.RunPython.noop),
+    ]
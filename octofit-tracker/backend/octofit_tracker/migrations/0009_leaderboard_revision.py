@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0008_search_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaderboard',
+            name='revision',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
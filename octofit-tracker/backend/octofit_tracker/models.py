@@ -1,4 +1,23 @@
+from datetime import date, datetime, time
+
 from djongo import models
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+# djongo stores DateField values as naive midnight datetimes. Raw pymongo
+# reads and writes convert with these two helpers.
+def to_midnight(value):
+    """Return a date, datetime or ISO date string as a stored date."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    if isinstance(value, datetime):
+        value = value.date()
+    return datetime.combine(value, time.min)
+
+
+def from_midnight(value):
+    """Return a stored date as a ``date``."""
+    return value.date() if isinstance(value, datetime) else value
 
 
 class User(models.Model):
@@ -8,6 +27,19 @@ class User(models.Model):
     email = models.EmailField(unique=True)
     password = models.CharField(max_length=100)
 
+    # Stamped on every write; see changes.py.
+    change_seq = models.BigIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Maintained on every write; see search.py.
+    search_terms = models.JSONField(default=list, editable=False)
+
+    objects = models.DjongoManager()
+    mongo_indexes = [
+        IndexModel([('username', ASCENDING)]),
+        IndexModel([('search_terms', ASCENDING)]),
+        IndexModel([('change_seq', ASCENDING)]),
+    ]
+
     class Meta:
         db_table = 'users'
 
@@ -20,6 +52,16 @@ class Team(models.Model):
     name = models.CharField(max_length=100)
     members = models.JSONField(default=list)
 
+    change_seq = models.BigIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = models.DjongoManager()
+    mongo_indexes = [
+        IndexModel([('name', ASCENDING)]),
+        IndexModel([('members', ASCENDING)]),
+        IndexModel([('change_seq', ASCENDING)]),
+    ]
+
     class Meta:
         db_table = 'teams'
 
@@ -34,6 +76,21 @@ class Activity(models.Model):
     duration = models.FloatField()
     date = models.DateField()
 
+    change_seq = models.BigIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = models.DjongoManager()
+    # One index per supported filter/ordering of /api/activities/, each
+    # ending in _id because the list breaks sort ties on it, plus change_seq
+    # for ?since=.
+    mongo_indexes = [
+        IndexModel([('username', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('username', ASCENDING), ('duration', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('activity_type', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('date', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('change_seq', ASCENDING)]),
+    ]
+
     class Meta:
         db_table = 'activities'
 
@@ -46,6 +103,18 @@ class Leaderboard(models.Model):
     username = models.CharField(max_length=100)
     score = models.IntegerField()
     calories = models.IntegerField(default=0)
+    # Incremented by every raw write; orders a row's states (see ranking.py).
+    revision = models.BigIntegerField(null=True, blank=True, editable=False)
+
+    change_seq = models.BigIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = models.DjongoManager()
+    mongo_indexes = [
+        IndexModel([('score', DESCENDING)]),
+        IndexModel([('username', ASCENDING)], unique=True),
+        IndexModel([('change_seq', ASCENDING)]),
+    ]
 
     class Meta:
         db_table = 'leaderboard'
@@ -60,8 +129,112 @@ class Workout(models.Model):
     description = models.TextField()
     exercises = models.JSONField(default=list)
 
+    change_seq = models.BigIntegerField(null=True, blank=True, editable=False)
+    updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    search_terms = models.JSONField(default=list, editable=False)
+
+    objects = models.DjongoManager()
+    mongo_indexes = [
+        IndexModel([('name', ASCENDING)]),
+        IndexModel([('search_terms', ASCENDING)]),
+        IndexModel([('change_seq', ASCENDING)]),
+    ]
+
     class Meta:
         db_table = 'workouts'
 
     def __str__(self):
         return self.name
+
+
+class ActivityDailyRollup(models.Model):
+    _id = models.ObjectIdField()
+    username = models.CharField(max_length=100)
+    activity_type = models.CharField(max_length=100)
+    date = models.DateField()
+    total_duration = models.FloatField(default=0)
+    count = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+    calories = models.IntegerField(default=0)
+
+    objects = models.DjongoManager()
+    mongo_indexes = [
+        IndexModel([('username', ASCENDING), ('activity_type', ASCENDING), ('date', ASCENDING)], unique=True),
+        IndexModel([('date', ASCENDING)]),
+    ]
+
+    class Meta:
+        db_table = 'activity_daily_rollups'
+
+    def __str__(self):
+        return f"{self.username} - {self.activity_type} - {self.date}"
+
+
+class RollupCoverage(models.Model):
+    _id = models.ObjectIdField()
+    name = models.CharField(max_length=100, unique=True)
+    covered_from = models.DateField()
+
+    objects = models.DjongoManager()
+
+    class Meta:
+        db_table = 'rollup_coverage'
+
+    def __str__(self):
+        return f"{self.name} from {self.covered_from}"
+
+
+class Tombstone(models.Model):
+    """Marks a deleted document so delta sync can report the deletion."""
+
+    _id = models.ObjectIdField()
+    collection = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=24)
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    objects = models.DjongoManager()
+    mongo_indexes = [
+        IndexModel([('collection', ASCENDING), ('change_seq', ASCENDING)]),
+        IndexModel([('deleted_at', ASCENDING)]),
+    ]
+
+    class Meta:
+        db_table = 'tombstones'
+
+    def __str__(self):
+        return f"{self.collection} {self.object_id} @ {self.change_seq}"
+
+
+class SyncCounter(models.Model):
+    _id = models.ObjectIdField()
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    objects = models.DjongoManager()
+
+    class Meta:
+        db_table = 'sync_counters'
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class JobCheckpoint(models.Model):
+    """Progress of a partitioned job, so an interrupted run can resume."""
+
+    _id = models.ObjectIdField()
+    name = models.CharField(max_length=100, unique=True)
+    options = models.JSONField(default=dict)
+    partitions = models.JSONField(default=list)
+    # Partition index (as a string) -> what its task returned.
+    results = models.JSONField(default=dict)
+    started_at = models.DateTimeField()
+
+    objects = models.DjongoManager()
+
+    class Meta:
+        db_table = 'job_checkpoints'
+
+    def __str__(self):
+        return f"{self.name}: {len(self.results)}/{len(self.partitions)}"
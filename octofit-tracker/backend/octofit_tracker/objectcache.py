@@ -0,0 +1,143 @@
+"""Per-process cache of hot documents for detail routes.
+
+``object_cache`` holds raw documents keyed by (collection, ``_id``) in a
+bounded LRU with a TTL. Misses are loaded with one ``find_one``. Detail
+reads go through ``Repository.lookup``, which uses the cache. Update and
+delete never do: ``ObjectIdLookupMixin.get_object`` reads them a fresh
+copy, because djongo saves the whole document back and a stale copy
+would undo other workers' writes.
+
+Model signals and the raw leaderboard writes invalidate entries in the
+process that made the write (see ``signals.py`` and ``leaderboard.py``).
+Other worker processes see the change when their entry expires, so
+``OCTOFIT_OBJECT_CACHE_TTL`` bounds how stale a detail read can be.
+Per-collection hit, miss, eviction, expiration and invalidation counts are
+served at ``/api/object-cache/`` and ``/metrics`` for tuning.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .models import from_midnight
+
+COUNTERS = ('hits', 'misses', 'evictions', 'expirations', 'invalidations')
+# search_terms can be large and is never part of a response.
+PROJECTION = {'search_terms': 0}
+
+
+class ObjectCache:
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {}
+        # Bumped by every invalidation, so a load that raced one is not stored.
+        self._version = 0
+
+    def _counters(self, table):
+        counters = self._stats.get(table)
+        if counters is None:
+            counters = self._stats[table] = dict.fromkeys(COUNTERS, 0)
+        return counters
+
+    def get(self, model, object_id, load):
+        """Return the cached document, or ``load()`` it and cache it."""
+        table = model._meta.db_table
+        key = (table, object_id)
+        with self._lock:
+            counters = self._counters(table)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, document = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    counters['hits'] += 1
+                    return document
+                del self._entries[key]
+                counters['expirations'] += 1
+            counters['misses'] += 1
+            version = self._version
+
+        document = load()
+        if document is None or not self.max_entries:
+            return document
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (time.monotonic() + self.ttl, document)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    (evicted, _), _ = self._entries.popitem(last=False)
+                    self._counters(evicted)['evictions'] += 1
+        return document
+
+    def invalidate(self, model, object_id=None):
+        """Drop one document of ``model``, or all of them if ``object_id`` is None."""
+        table = model._meta.db_table
+        with self._lock:
+            self._version += 1
+            if object_id is None:
+                keys = [key for key in self._entries if key[0] == table]
+            else:
+                keys = [(table, object_id)] if (table, object_id) in self._entries else []
+            for key in keys:
+                del self._entries[key]
+            self._counters(table)['invalidations'] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def snapshot(self):
+        """Return the counters, size and hit ratio of every collection."""
+        with self._lock:
+            sizes = {}
+            for table, _ in self._entries:
+                sizes[table] = sizes.get(table, 0) + 1
+            snapshot = {}
+            for table, counters in sorted(self._stats.items()):
+                lookups = counters['hits'] + counters['misses']
+                snapshot[table] = dict(
+                    counters,
+                    size=sizes.get(table, 0),
+                    hit_ratio=counters['hits'] / lookups if lookups else None,
+                )
+            return snapshot
+
+
+object_cache = ObjectCache(settings.OCTOFIT_OBJECT_CACHE_SIZE, settings.OCTOFIT_OBJECT_CACHE_TTL)
+
+
+def get_document(model, object_id):
+    """Return the raw document ``object_id`` of ``model``, or ``None``."""
+    return object_cache.get(
+        model, object_id, lambda: model.objects.mongo_find_one({'_id': object_id}, PROJECTION)
+    )
+
+
+def instance_from_document(model, document):
+    """Build a model instance from a raw document, as a djongo query would.
+
+    The document is copied, so changing the instance leaves the cache alone.
+    """
+    names, values = [], []
+    for field in model._meta.concrete_fields:
+        if field.attname not in document:
+            value = field.get_default()
+        else:
+            value = copy.deepcopy(document[field.attname])
+        internal_type = field.get_internal_type()
+        if internal_type == 'DateField':
+            value = from_midnight(value)
+        elif internal_type == 'DateTimeField' and value is not None and settings.USE_TZ and timezone.is_naive(value):
+            value = value.replace(tzinfo=dt_timezone.utc)
+        names.append(field.attname)
+        values.append(value)
+    return model.from_db(DEFAULT_DB_ALIAS, names, values)
@@ -0,0 +1,79 @@
+from bson.errors import InvalidId
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class ObjectIdCursorPagination(CursorPagination):
+    """Keyset pagination over the monotonic MongoDB ``_id``.
+
+    Each page is fetched with ``_id > <last seen _id>`` sorted on ``_id``, so
+    MongoDB walks the primary index from the cursor position instead of
+    skipping over every earlier document. Deep pages cost the same as the
+    first one.
+
+    Views with an ordering filter may sort on another field first; their
+    ordering must end with ``_id``. The cursor position then holds both
+    values of the last row, e.g. ``2024-01-13,<_id>``, and the next page is
+    the rows after that pair (see ``DocumentQuery.after``). Positions are
+    unique, so DRF's offset for paging through ties is never used, and any
+    number of rows may share a date.
+    """
+
+    ordering = '_id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            return self._paginate_queryset(queryset, request, view)
+        except (InvalidId, ValueError):
+            # The cursor position does not parse as the ordering fields.
+            raise NotFound(self.invalid_cursor_message)
+
+    def _paginate_queryset(self, queryset, request, view):
+        # CursorPagination.paginate_queryset, with a composite position and
+        # without offsets.
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+        reverse, position = (cursor.reverse, cursor.position) if cursor else (False, None)
+        self.cursor = cursor and Cursor(offset=0, reverse=reverse, position=position)
+
+        if reverse:
+            queryset = queryset.order_by(*[
+                field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering
+            ])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            fields = [field.lstrip('-') for field in self.ordering]
+            values = position.rsplit(',', len(fields) - 1)
+            if len(values) != len(fields):
+                raise ValueError(position)
+            descending = self.ordering[0].startswith('-')
+            queryset = queryset.after(fields, values, 'lt' if reverse != descending else 'gt')
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = position is not None, position
+            self.has_previous, self.previous_position = following is not None, following
+        else:
+            self.has_next, self.next_position = following is not None, following
+            self.has_previous, self.previous_position = position is not None, position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        return ','.join(str(instance[field.lstrip('-')]) for field in ordering)
@@ -0,0 +1,117 @@
+"""MongoDB connection pool metrics.
+
+``PoolMetrics`` is a pymongo connection pool listener that tracks, per server
+address, how many connections are open and checked out, the peak checkout
+level, how long requests wait for a connection and how many waits timed out.
+Compare ``peak_in_use`` and the wait times with ``max_pool_size`` to size
+``OCTOFIT_MONGO_MAX_POOL_SIZE`` to real traffic.
+"""
+import logging
+import threading
+import time
+
+from pymongo import common, monitoring
+
+logger = logging.getLogger(__name__)
+
+# Checkouts slower than this are logged as a sign of a saturated pool.
+SLOW_CHECKOUT_SECONDS = 0.1
+
+
+class _AddressStats:
+    def __init__(self, max_pool_size=None):
+        self.max_pool_size = max_pool_size
+        self.open = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def snapshot(self):
+        return {
+            'max_pool_size': self.max_pool_size,
+            'open': self.open,
+            'in_use': self.in_use,
+            'peak_in_use': self.peak_in_use,
+            'checkouts': self.checkouts,
+            'wait_seconds_total': self.wait_seconds_total,
+            'wait_seconds_max': self.wait_seconds_max,
+            'timeouts': self.timeouts,
+        }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}
+
+    def _address(self, event):
+        key = '%s:%s' % event.address
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = _AddressStats()
+        return stats
+
+    def pool_created(self, event):
+        with self._lock:
+            self._address(event).max_pool_size = event.options.get('maxPoolSize', common.MAX_POOL_SIZE)
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._stats.pop('%s:%s' % event.address, None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._address(event).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            stats = self._address(event)
+            stats.open = max(stats.open - 1, 0)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        if event.reason != monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            return
+        with self._lock:
+            self._address(event).timeouts += 1
+        logger.warning('Timed out waiting for a MongoDB connection to %s:%s; the pool is saturated.', *event.address)
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        waited = time.perf_counter() - started if started is not None else 0.0
+        self._local.started = None
+        with self._lock:
+            stats = self._address(event)
+            stats.in_use += 1
+            stats.peak_in_use = max(stats.peak_in_use, stats.in_use)
+            stats.checkouts += 1
+            stats.wait_seconds_total += waited
+            stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+        if waited > SLOW_CHECKOUT_SECONDS:
+            logger.info('Waited %.3fs for a MongoDB connection to %s:%s.', waited, *event.address)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            stats = self._address(event)
+            stats.in_use = max(stats.in_use - 1, 0)
+
+    def snapshot(self):
+        """Return the current counters keyed by ``host:port``."""
+        with self._lock:
+            return {address: stats.snapshot() for address, stats in self._stats.items()}
+
+
+pool_metrics = PoolMetrics()
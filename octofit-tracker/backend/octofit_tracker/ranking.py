@@ -0,0 +1,236 @@
+"""In-process ranked view of the leaderboard.
+
+Keeps ``(-score, username)`` tuples in a sorted list so top-N reads and
+single-user rank lookups are a bisect away instead of a sort of the whole
+collection. The structure is loaded lazily from one query and then kept in
+sync by the leaderboard engine and the Leaderboard model signals.
+
+Other worker processes and the management commands write the collection
+too. At most every ``OCTOFIT_RANKING_REFRESH_SECONDS`` a read fetches the
+rows whose ``change_seq`` is past the last one seen, using the same index
+as delta sync (see ``changes.py``). A deletion or a wiped collection
+(a newer tombstone or sync floor) reloads the whole structure instead.
+
+Every raw write to a row increments its ``revision`` in the same update,
+so the revision orders a row's states as they landed. ``update`` ignores a
+state older than the one already held, which lets the engine and the
+refreshes apply rows without holding the lock across MongoDB round trips.
+The lock only guards the in-memory structure.
+
+A row whose revision is newer than the one held is a change this process
+has not seen yet, whether the engine or a refresh applies it. Each one is
+published to ``feed`` as a ``score`` event, so open streams hear about
+every process's writes exactly once. A reload after a deletion or a wipe
+publishes ``resync``.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from pymongo import ASCENDING, DESCENDING
+
+from . import changes
+from .changefeed import feed
+from .models import Leaderboard, Tombstone
+
+ROW_FIELDS = {'username': 1, 'score': 1, 'calories': 1, 'revision': 1, 'change_seq': 1, 'updated_at': 1}
+
+
+class LeaderboardRanking:
+    def __init__(self, refresh_seconds=None):
+        self.refresh_seconds = (
+            settings.OCTOFIT_RANKING_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        )
+        self._lock = threading.RLock()
+        # Held while reading MongoDB, so one thread refreshes at a time.
+        self._refreshing = threading.Lock()
+        self._entries = []
+        self._rows = {}
+        self._loaded = False
+        self._checked = 0
+        # Updates made while a full load reads the collection; replayed on it.
+        self._pending = None
+        # The last settled change_seq, tombstone and floor that were read.
+        self._seq = self._tombstone_seq = self._floor = 0
+
+    def _latest_tombstone(self):
+        row = Tombstone.objects.mongo_find_one(
+            {'collection': Leaderboard._meta.db_table}, {'change_seq': 1}, sort=[('change_seq', DESCENDING)]
+        )
+        return row['change_seq'] if row else 0
+
+    def _apply_rows(self, rows, seq, events=None):
+        """Put ``rows``, sorted by change_seq, in the structure.
+
+        Returns the change_seq to read past next time: that of the last row
+        before the first one still inside the settle window, since older
+        sequence numbers may still be in flight behind it. Score events for
+        the rows that were news are appended to ``events``.
+        """
+        settled = timezone.now() - timedelta(seconds=changes.SETTLE_SECONDS)
+        settling = False
+        for row in rows:
+            self._put(row['username'], row.get('score'), row.get('calories'), row.get('revision'), events)
+            if settling or row.get('change_seq') is None:
+                continue
+            updated_at = row.get('updated_at')
+            if updated_at and changes._utc(updated_at) > settled:
+                settling = True
+            else:
+                seq = row['change_seq']
+        return seq
+
+    def _load(self):
+        with self._lock:
+            self._pending = []
+        try:
+            floor, tombstone_seq = changes.floor(), self._latest_tombstone()
+            rows = list(Leaderboard.objects.mongo_find({}, ROW_FIELDS, sort=[('change_seq', ASCENDING)]))
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._rows, self._entries = {}, []
+            self._seq = self._apply_rows(rows, 0)
+            for username, row in pending:
+                if row is None:
+                    self._discard(username)
+                else:
+                    self._put(username, *row)
+            self._floor, self._tombstone_seq = floor, tombstone_seq
+            self._loaded = True
+            self._checked = time.monotonic()
+
+    def _refresh(self):
+        if changes.floor() != self._floor or self._latest_tombstone() != self._tombstone_seq:
+            self._load()
+            feed.publish({'type': 'resync'})
+            return
+        seq = self._seq
+        rows = list(Leaderboard.objects.mongo_find(
+            {'change_seq': {'$gt': seq}}, ROW_FIELDS, sort=[('change_seq', ASCENDING)]
+        ))
+        events = [] if feed else None
+        with self._lock:
+            if self._loaded:
+                self._seq = self._apply_rows(rows, seq, events)
+                self._checked = time.monotonic()
+        self._publish(events)
+
+    def _ensure_current(self):
+        with self._lock:
+            loaded = self._loaded
+            if loaded and time.monotonic() - self._checked < self.refresh_seconds:
+                return
+        # Once loaded, readers keep serving the current structure while
+        # another thread refreshes it.
+        if not self._refreshing.acquire(blocking=not loaded):
+            return
+        try:
+            if not self._loaded:
+                self._load()
+            elif time.monotonic() - self._checked >= self.refresh_seconds:
+                self._refresh()
+        finally:
+            self._refreshing.release()
+
+    def poll(self):
+        """Pick up other processes' writes if a refresh is due; streams call this."""
+        self._ensure_current()
+
+    def invalidate(self):
+        """Drop the cached structure; the next read reloads it."""
+        with self._lock:
+            self._entries = []
+            self._rows = {}
+            self._loaded = False
+
+    def update(self, username, score, calories=0, revision=None):
+        """Put ``username``'s row unless a later ``revision`` of it is held."""
+        events = [] if feed else None
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((username, (score, calories, revision)))
+            if self._loaded:
+                self._put(username, score, calories, revision, events)
+        self._publish(events)
+
+    def _put(self, username, score, calories, revision, events=None):
+        score, calories, revision = score or 0, calories or 0, revision or 0
+        previous = self._rows.get(username)
+        if previous is not None and revision < previous[2]:
+            return
+        news = events is not None and (previous is None or revision > previous[2])
+        previous_rank = self._rank_of(previous[0]) if news and previous else None
+        self._discard(username)
+        self._rows[username] = (score, calories, revision)
+        insort(self._entries, (-score, username))
+        if news:
+            events.append({
+                'type': 'score',
+                'username': username,
+                'score': score,
+                'calories': calories,
+                'rank': self._rank_of(score),
+                'delta': score - (previous[0] if previous else 0),
+                'previous_rank': previous_rank,
+            })
+
+    def _publish(self, events):
+        for event in events or ():
+            feed.publish(event)
+
+    def remove(self, username):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((username, None))
+            if self._loaded:
+                self._discard(username)
+
+    def _discard(self, username):
+        previous = self._rows.pop(username, None)
+        if previous is None:
+            return
+        index = bisect_left(self._entries, (-previous[0], username))
+        if index < len(self._entries) and self._entries[index] == (-previous[0], username):
+            del self._entries[index]
+
+    def _rank_of(self, score):
+        # Competition ranking: tied scores share the rank of the first of them.
+        return bisect_left(self._entries, (-score, '')) + 1
+
+    def _row(self, index):
+        negative_score, username = self._entries[index]
+        return {
+            'rank': self._rank_of(-negative_score),
+            'username': username,
+            'score': -negative_score,
+            'calories': self._rows[username][1],
+        }
+
+    def top(self, n):
+        self._ensure_current()
+        with self._lock:
+            return [self._row(index) for index in range(min(n, len(self._entries)))]
+
+    def rank(self, username):
+        """Return the ranked row for ``username`` or ``None`` if unranked."""
+        self._ensure_current()
+        with self._lock:
+            row = self._rows.get(username)
+            if row is None:
+                return None
+            return self._row(bisect_left(self._entries, (-row[0], username)))
+
+    def __len__(self):
+        self._ensure_current()
+        with self._lock:
+            return len(self._entries)
+
+
+ranking = LeaderboardRanking()
@@ -0,0 +1,63 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # Optional; ORJSONRenderer falls back to the stdlib.
+    orjson = None
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON.
+
+    Exports stream their own body; this renders the remaining small payloads
+    (such as validation errors) as a single JSON line.
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, cls=JSONEncoder) + '\n').encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV; small dict payloads such as errors render as key,value rows."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        items = data.items() if isinstance(data, dict) else enumerate(data)
+        for key, value in items:
+            writer.writerow([key, value if isinstance(value, str) else json.dumps(value, cls=JSONEncoder)])
+        return buffer.getvalue().encode(self.charset)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` backed by orjson when it is installed.
+
+    Output matches DRF's compact JSON except that U+2028/U+2029 are not
+    escaped and floats with an exponent are written without a ``+``.
+    Indented output for the browsable API still uses the stdlib encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Datetimes go through DRF's encoder so they keep its ISO format.
+        return orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
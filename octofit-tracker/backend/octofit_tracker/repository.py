@@ -0,0 +1,222 @@
+"""Direct pymongo reads for the list and retrieve endpoints.
+
+Every ORM query goes through djongo, which parses the SQL Django generates
+and translates it into a MongoDB query on each call. ``Repository`` skips
+both steps: it issues ``find`` with a projection of the serializer's fields
+and encodes the raw documents into plain dicts shaped exactly like the
+serializer output. Writes stay on the ORM so the model signals keep firing.
+
+``Repository.only`` narrows both the projection and the encoders to a sparse
+fieldset, so unrequested fields are never read from disk or decoded.
+``DocumentQuery.order_by`` widens it again to the sort fields, which cursor
+pagination reads from the last row of a page.
+"""
+import copy
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+
+from . import metrics, objectcache
+from .models import to_midnight
+from .serializers import (
+    UserSerializer, TeamSerializer, ActivitySerializer,
+    LeaderboardSerializer, WorkoutSerializer, _parse_list_field
+)
+
+
+def _field_encoder(model_field):
+    internal_type = model_field.get_internal_type()
+    if internal_type == 'ObjectIdField':
+        return lambda value: str(value) if value else None
+    if internal_type == 'DateField':
+        return lambda value: value.date().isoformat() if value else None
+    if internal_type == 'JSONField':
+        return _parse_list_field
+    if internal_type == 'FloatField':
+        return lambda value: float(value) if value is not None else None
+    if internal_type == 'IntegerField':
+        return lambda value: int(value) if value is not None else None
+    return lambda value: value
+
+
+def _field_coercer(model_field):
+    """Convert a query value, e.g. a cursor position string, to its stored type."""
+    internal_type = model_field.get_internal_type()
+    if internal_type == 'ObjectIdField':
+        return lambda value: value if isinstance(value, ObjectId) else ObjectId(value)
+    if internal_type == 'DateField':
+        return to_midnight
+    if internal_type == 'FloatField':
+        return float
+    if internal_type == 'IntegerField':
+        return int
+    return lambda value: value
+
+
+def plan_stages(plan):
+    """Return the stage names of an explain() winning plan, outermost first."""
+    stages = [plan['stage']] if 'stage' in plan else []
+    for key in ('queryPlan', 'inputStage'):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get('inputStages', ()):
+        stages += plan_stages(child)
+    return stages
+
+
+class Repository:
+    """Read access to one collection, encoded like ``serializer_class``."""
+
+    def __init__(self, serializer_class):
+        self.model = serializer_class.Meta.model
+        self.encoders = [
+            (name, _field_encoder(self.model._meta.get_field(name)))
+            for name in serializer_class.Meta.fields
+        ]
+        self.projection = {name: 1 for name, _ in self.encoders}
+        self.coercers = {field.name: _field_coercer(field) for field in self.model._meta.concrete_fields}
+        self.full = self
+        self._sparse = {}
+
+    @property
+    def field_names(self):
+        return [name for name, _ in self.encoders]
+
+    def only(self, fields):
+        """Return a repository limited to ``fields``; ``_id`` is always kept."""
+        full = self.full
+        key = frozenset(fields) | {'_id'}
+        sparse = full._sparse.get(key)
+        if sparse is None:
+            sparse = copy.copy(full)
+            sparse.encoders = [(name, encode) for name, encode in full.encoders if name in key]
+            sparse.projection = {name: 1 for name, _ in sparse.encoders}
+            sparse._sparse = {}
+            full._sparse[key] = sparse
+        return sparse
+
+    def including(self, fields):
+        """Return this repository, widened to also read ``fields``."""
+        missing = set(fields) - set(self.field_names)
+        return self.only([*self.field_names, *missing]) if missing else self
+
+    def to_representation(self, document):
+        """Encode a raw document the way the serializer would."""
+        return {name: encode(document.get(name)) for name, encode in self.encoders}
+
+    def find(self, query=None, sort=None, skip=0, limit=0):
+        cursor = self.model.objects.mongo_find(query or {}, self.projection, sort=sort, skip=skip, limit=limit)
+        documents = list(cursor)
+        with metrics.timer('serializer'):
+            return [self.to_representation(document) for document in documents]
+
+    def lookup(self, pk):
+        """Return the raw document with ``_id`` ``pk``, or ``None``.
+
+        The whole document is read through ``objectcache``, so every
+        fieldset of a hot document is served from one cache entry. This is
+        the only read path that uses the cache.
+        """
+        try:
+            object_id = ObjectId(pk)
+        except (InvalidId, TypeError):
+            return None
+        return objectcache.get_document(self.model, object_id)
+
+    def encode(self, document):
+        with metrics.timer('serializer'):
+            return self.to_representation(document)
+
+    def get(self, pk):
+        """Return the encoded document with ``_id`` ``pk``, or ``None``."""
+        document = self.lookup(pk)
+        return None if document is None else self.encode(document)
+
+    def all(self):
+        return DocumentQuery(self)
+
+
+class DocumentQuery:
+    """The slice of the QuerySet API that DRF's filters and pagination use.
+
+    ``order_by``, ``filter`` with exact, ``__gt``, ``__gte``, ``__lt`` and
+    ``__lte`` lookups, ``after`` and slicing build a single ``find``;
+    nothing runs until the query is sliced or iterated. Values are coerced
+    to the stored type, so cursor positions and dates can be passed as
+    strings.
+    """
+
+    def __init__(self, repository, query=None, sort=None):
+        self.repository = repository
+        self.query = query or {}
+        self.sort = sort
+
+    def order_by(self, *fields):
+        sort = [(field.lstrip('-'), DESCENDING if field.startswith('-') else ASCENDING) for field in fields]
+        # Cursor pagination reads the sort key from the rows it returns.
+        repository = self.repository.including(field for field, _ in sort)
+        return DocumentQuery(repository, self.query, sort)
+
+    def filter(self, **lookups):
+        query = dict(self.query)
+        for lookup, value in lookups.items():
+            field, _, operator = lookup.partition('__')
+            value = self.repository.coercers[field](value)
+            condition = {f'${operator}': value} if operator else value
+            if isinstance(condition, dict) and isinstance(query.get(field), dict):
+                condition = {**query[field], **condition}
+            query[field] = condition
+        return DocumentQuery(self.repository, query, self.sort)
+
+    def after(self, fields, values, operator):
+        """Rows past ``values`` of ``fields`` in keyset order.
+
+        ``operator`` is ``'gt'`` or ``'lt'``. For ``('date', '_id')`` with
+        ``'lt'`` this is ``date < d or (date == d and _id < id)``, bounded by
+        ``date <= d`` so the index scan starts at the position.
+        """
+        values = [self.repository.coercers[field](value) for field, value in zip(fields, values)]
+        if len(fields) == 1:
+            return self.filter(**{f'{fields[0]}__{operator}': values[0]})
+        branches = []
+        for index, field in enumerate(fields):
+            branch = dict(zip(fields[:index], values[:index]))
+            branch[field] = {f'${operator}': values[index]}
+            branches.append(branch)
+        query = self.filter(**{f'{fields[0]}__{operator}e': values[0]}).query
+        if '$or' in query:
+            query = {'$and': [query, {'$or': branches}]}
+        else:
+            query = {**query, '$or': branches}
+        return DocumentQuery(self.repository, query, self.sort)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('DocumentQuery only supports slicing without a step.')
+        start = key.start or 0
+        limit = key.stop - start if key.stop is not None else 0
+        return self.repository.find(self.query, self.sort, skip=start, limit=limit)
+
+    def __iter__(self):
+        return iter(self.repository.find(self.query, self.sort))
+
+    def explain(self):
+        """Return the stage names of the winning query plan."""
+        cursor = self.repository.model.objects.mongo_find(self.query, self.repository.projection, sort=self.sort)
+        return plan_stages(cursor.explain()['queryPlanner']['winningPlan'])
+
+
+REPOSITORIES = {
+    'users': Repository(UserSerializer),
+    'teams': Repository(TeamSerializer),
+    'activities': Repository(ActivitySerializer),
+    'leaderboard': Repository(LeaderboardSerializer),
+    'workouts': Repository(WorkoutSerializer),
+}
+
+_BY_MODEL = {repository.model: repository for repository in REPOSITORIES.values()}
+
+
+def for_model(model):
+    return _BY_MODEL[model]
@@ -0,0 +1,185 @@
+"""Materialized daily activity rollups.
+
+``activity_daily_rollups`` holds one document per (username, activity_type,
+date) with the summed duration, count, score and calories of that day's
+activities. Activity writes keep it current with ``$inc`` deltas (see
+``signals.py``). ``refresh()`` rebuilds a date range from the activities
+collection and records how far back the rollups are complete. Readers check
+``covers()`` before using them instead of the raw activities.
+"""
+from datetime import date
+
+from pymongo import UpdateOne
+
+from . import jobs, leaderboard
+from .models import Activity, ActivityDailyRollup, RollupCoverage, to_midnight
+
+COVERAGE_NAME = 'activity_daily'
+# Coverage value meaning every activity ever written is rolled up.
+FULL_HISTORY = date.min
+
+
+def covered_from():
+    """Return the first date the rollups are complete from, or ``None``."""
+    row = RollupCoverage.objects.mongo_find_one({'name': COVERAGE_NAME})
+    return row['covered_from'].date() if row else None
+
+
+def covers(date_from):
+    """Whether rollups hold every activity on or after ``date_from``.
+
+    ``date_from=None`` means the whole history.
+    """
+    start = covered_from()
+    if start is None:
+        return False
+    if start == FULL_HISTORY:
+        return True
+    return date_from is not None and date_from >= start
+
+
+def _set_covered_from(start):
+    current = covered_from()
+    if current is not None and current <= start:
+        return
+    RollupCoverage.objects.mongo_update_one(
+        {'name': COVERAGE_NAME},
+        {'$set': {'covered_from': to_midnight(start)}},
+        upsert=True,
+    )
+
+
+def apply_delta(username, activity_type, day, duration, count):
+    """Add ``duration`` and ``count`` (+1 or -1) to one day's rollup."""
+    if not username or day is None:
+        return
+    key = {'username': username, 'activity_type': activity_type, 'date': to_midnight(day)}
+    score, calories = leaderboard.activity_points(duration)
+    ActivityDailyRollup.objects.mongo_update_one(
+        key,
+        {'$inc': {
+            'total_duration': count * (duration or 0),
+            'count': count,
+            'score': count * score,
+            'calories': count * calories,
+        }},
+        upsert=True,
+    )
+    if count < 0:
+        ActivityDailyRollup.objects.mongo_delete_one(dict(key, count={'$lte': 0}))
+
+
+def _normalize(entry):
+    # Stored dates come back as datetimes, model instances hold dates.
+    if entry is None:
+        return None
+    username, activity_type, day, duration = entry
+    return username, activity_type, to_midnight(day) if day else None, duration
+
+
+def apply_activity_change(old, new):
+    """Move an activity between rollups.
+
+    Both arguments are ``(username, activity_type, date, duration)`` tuples
+    or ``None`` for the missing side of a create or delete.
+    """
+    old, new = _normalize(old), _normalize(new)
+    if old == new:
+        return
+    if old is not None:
+        apply_delta(*old, count=-1)
+    if new is not None:
+        apply_delta(*new, count=1)
+
+
+def apply_bulk_activities(entries):
+    """Add many new activities in one ``bulk_write``.
+
+    ``entries`` yields ``(username, activity_type, date, duration)`` tuples;
+    deltas are summed per rollup key first.
+    """
+    deltas = {}
+    for username, activity_type, day, duration in entries:
+        key = (username, activity_type, to_midnight(day))
+        score, calories = leaderboard.activity_points(duration)
+        total, count, total_score, total_calories = deltas.get(key, (0, 0, 0, 0))
+        deltas[key] = (total + (duration or 0), count + 1, total_score + score, total_calories + calories)
+    if not deltas:
+        return
+    ActivityDailyRollup.objects.mongo_bulk_write([
+        UpdateOne(
+            {'username': username, 'activity_type': activity_type, 'date': day},
+            {'$inc': {'total_duration': total, 'count': count, 'score': score, 'calories': calories}},
+            upsert=True,
+        )
+        for (username, activity_type, day), (total, count, score, calories) in deltas.items()
+    ], ordered=False)
+
+
+def refresh(since=None, batch_size=1000, workers=1, resume=False, stdout=None):
+    """Rebuild rollups for every day on or after ``since`` (all days if None).
+
+    With ``workers`` > 1 the usernames are split into ranges that are
+    refreshed in parallel processes; see ``jobs.py``. Returns the number of
+    rollup documents written. Writes that land on the refreshed range while
+    this runs may be lost; run it during quiet periods.
+    """
+    written = jobs.run(
+        'refresh_rollups', refresh_range,
+        lambda: jobs.key_ranges(Activity, 'username', jobs.partition_count(workers)),
+        workers=workers, resume=resume, stdout=stdout,
+        since=since.isoformat() if since else None, batch_size=batch_size,
+    )
+    _set_covered_from(FULL_HISTORY if since is None else since)
+    return written
+
+
+def refresh_range(partition, since, batch_size):
+    """Rebuild the rollups of the usernames in ``partition``; a ``jobs`` task."""
+    match = jobs.range_match('username', partition)
+    if since is not None:
+        match['date'] = {'$gte': to_midnight(since)}
+    ActivityDailyRollup.objects.mongo_delete_many(match)
+
+    cursor = Activity.objects.mongo_aggregate(
+        [
+            {'$match': match},
+            {'$group': {
+                '_id': {
+                    'username': '$username',
+                    'activity_type': '$activity_type',
+                    'date': '$date',
+                },
+                'total_duration': {'$sum': '$duration'},
+                'count': {'$sum': 1},
+                'score': leaderboard.points_expression(leaderboard.SCORE_PER_MINUTE),
+                'calories': leaderboard.points_expression(leaderboard.CALORIES_PER_MINUTE),
+            }},
+        ],
+        allowDiskUse=True,
+        batchSize=batch_size,
+    )
+    written = 0
+    batch = []
+    for row in cursor:
+        batch.append(dict(
+            row['_id'],
+            total_duration=row['total_duration'],
+            count=row['count'],
+            score=int(row['score']),
+            calories=int(row['calories']),
+        ))
+        if len(batch) >= batch_size:
+            ActivityDailyRollup.objects.mongo_insert_many(batch, ordered=False)
+            written += len(batch)
+            batch = []
+    if batch:
+        ActivityDailyRollup.objects.mongo_insert_many(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+def clear():
+    """Drop every rollup and forget the recorded coverage."""
+    ActivityDailyRollup.objects.mongo_delete_many({})
+    RollupCoverage.objects.mongo_delete_many({'name': COVERAGE_NAME})
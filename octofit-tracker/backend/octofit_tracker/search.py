@@ -0,0 +1,94 @@
+"""Prefix search over users and workouts.
+
+Each searchable document stores ``search_terms``: the distinct normalized
+words of its ``SEARCH_FIELDS``. They are computed on save (see
+``signals.py``) and by the raw inserts of ``populate_db``, and covered by a
+multikey index. A query such as ``iron con`` matches documents that have
+the term ``iron`` and any term starting with ``con``. Every word is one
+index lookup or one index range, so a search reads only the index entries
+it returns, whatever the collection size.
+
+MongoDB text indexes were not used because they match whole stemmed
+words and cannot autocomplete. An in-process inverted index would be
+rebuilt and kept in memory by every worker and would go stale across
+workers.
+"""
+import re
+import unicodedata
+
+from .models import User, Workout
+from .serializers import _parse_list_field
+
+SEARCH_FIELDS = {
+    User: ('username', 'name'),
+    Workout: ('name', 'description', 'exercises'),
+}
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercase, strip accents and split ``text`` into words."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return _WORD.findall(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def terms(model, get):
+    """The sorted ``search_terms`` of a document, reading fields with ``get``."""
+    words = set()
+    for field in SEARCH_FIELDS[model]:
+        value = get(field)
+        for text in (_parse_list_field(value) if field == 'exercises' else [value]):
+            if isinstance(text, str):
+                words.update(tokenize(text))
+    return sorted(words)
+
+
+def index_instance(instance):
+    instance.search_terms = terms(type(instance), lambda field: getattr(instance, field, None))
+
+
+def index_documents(model, documents):
+    """Add ``search_terms`` to raw documents that are about to be inserted."""
+    for document in documents:
+        document['search_terms'] = terms(model, document.get)
+    return documents
+
+
+def _successor(prefix):
+    # Every string starting with prefix sorts below this one.
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def build_query(text):
+    """Return the MongoDB query for ``text``, or ``None`` if it has no words.
+
+    Every word but the last must match a term exactly; the last one, which
+    the user may still be typing, matches as a prefix.
+    """
+    words = tokenize(text)
+    if not words:
+        return None
+    *exact, prefix = words
+    conditions = [{'search_terms': word} for word in exact]
+    conditions.append({'search_terms': {'$elemMatch': {'$gte': prefix, '$lt': _successor(prefix)}}})
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
+def search(repository, text, limit=DEFAULT_LIMIT):
+    """Return up to ``limit`` documents matching ``text``, encoded by ``repository``."""
+    query = build_query(text)
+    if query is None:
+        return []
+    return repository.find(query, limit=limit)
+
+
+def matching_ids(model, text, limit=None):
+    """Return the ``_id`` of up to ``limit`` documents matching ``text``."""
+    query = build_query(text)
+    if query is None:
+        return []
+    cursor = model.objects.mongo_find(query, {'_id': 1}, limit=limit or 0)
+    return [document['_id'] for document in cursor]
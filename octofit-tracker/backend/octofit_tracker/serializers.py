@@ -1,26 +1,51 @@
+from collections.abc import Mapping
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from bson import ObjectId
 import ast
+import json
+from . import metrics
 from .models import User, Team, Activity, Leaderboard, Workout
 
 
 def _parse_list_field(value):
-    """Normalise a Djongo JSONField that may come back as a Python-repr string."""
+    """Normalise a Djongo JSONField that may come back as a string.
+
+    Since migration 0005 these fields are stored as native BSON arrays, which
+    return immediately. Legacy strings are tried as JSON before falling back
+    to the much slower Python-literal parser.
+    """
     if isinstance(value, list):
         return value
     if isinstance(value, str):
         try:
-            parsed = ast.literal_eval(value)
-            return parsed if isinstance(parsed, list) else []
-        except (ValueError, SyntaxError):
-            return []
+            parsed = json.loads(value)
+        except ValueError:
+            try:
+                parsed = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return []
+        return parsed if isinstance(parsed, list) else []
     return []
 
 
+class ObjectIdField(serializers.Field):
+    """Read-only MongoDB ``_id`` rendered as its hex string."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return str(value)
+
+
 class ListField(serializers.Field):
     """Read/write field that keeps members as a real Python list."""
 
     def to_representation(self, value):
+        if type(value) is list:
+            return value
         return _parse_list_field(value)
 
     def to_internal_value(self, data):
@@ -31,60 +56,170 @@ class ListField(serializers.Field):
         raise serializers.ValidationError('Expected a list.')
 
 
-class UserSerializer(serializers.ModelSerializer):
-    _id = serializers.SerializerMethodField()
+class MembersField(ListField):
+    """Team members; embeds user details when the view supplies them.
+
+    For ?expand=members the view puts an ``expanded_members`` map in the
+    serializer context.
+    """
+
+    def to_representation(self, value):
+        members = super().to_representation(value)
+        expanded = self.context.get('expanded_members')
+        if expanded is not None:
+            return expand_members(members, expanded)
+        return members
+
+
+def expand_members(usernames, expanded):
+    """Replace member usernames with their entries in ``expanded``."""
+    return [expanded.get(username, {'username': username}) for username in usernames]
+
+
+class TimedDataMixin:
+    """Charge the time spent building ``.data`` to the request's metrics."""
+
+    @property
+    def data(self):
+        with metrics.timer('serializer'):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+# DRF fields whose to_representation is a plain type conversion.
+_CONVERSIONS = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+    ObjectIdField: str,
+}
+
+
+class FastListSerializer(TimedListSerializer):
+    """List serializer that encodes rows without DRF's per-field dispatch.
+
+    The child's fields are compiled once into ``(name, attribute, encode)``
+    triples, and each row becomes a plain dict built from direct attribute
+    reads. Fields with their own ``get_attribute`` (such as ``ModelField``)
+    get the instance itself, as with ``attribute`` ``None``. The JSON output
+    is the same as ``ListSerializer``'s. Children that override
+    ``to_representation`` or use dotted or ``'*'`` sources, and mapping
+    instances, take the regular path.
+    """
+
+    def _compile(self):
+        child = self.child
+        if type(child).to_representation is not serializers.Serializer.to_representation:
+            return None
+        compiled = []
+        for field in child._readable_fields:
+            if field.source == '*' or len(field.source_attrs) != 1:
+                return None
+            if type(field).get_attribute is not serializers.Field.get_attribute:
+                compiled.append((field.field_name, None, field.to_representation))
+                continue
+            encode = _CONVERSIONS.get(type(field), field.to_representation)
+            compiled.append((field.field_name, field.source_attrs[0], encode))
+        return compiled
+
+    def to_representation(self, data):
+        compiled = self._compile()
+        iterable = data.all() if hasattr(data, 'all') else data
+        if compiled is None:
+            return super().to_representation(iterable)
+        rows = []
+        for instance in iterable:
+            if isinstance(instance, Mapping):
+                rows.append(self.child.to_representation(instance))
+                continue
+            row = {}
+            for name, attribute, encode in compiled:
+                value = instance if attribute is None else getattr(instance, attribute)
+                row[name] = None if value is None else encode(value)
+            rows.append(row)
+        return rows
+
+
+class PartialListSerializer(FastListSerializer):
+    """List serializer that keeps the valid items instead of failing the batch.
+
+    After ``is_valid()``, ``valid_items`` holds ``(index, validated_data)``
+    pairs and ``item_errors`` maps each invalid index to its errors.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(input_type=type(data).__name__)
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='not_a_list'
+            )
+        if not self.allow_empty and not data:
+            message = self.error_messages['empty']
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='empty'
+            )
+        if self.max_length is not None and len(data) > self.max_length:
+            message = self.error_messages['max_length'].format(max_length=self.max_length)
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='max_length'
+            )
+
+        self.valid_items = []
+        self.item_errors = {}
+        for index, item in enumerate(data):
+            try:
+                self.valid_items.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                self.item_errors[index] = exc.detail
+        return [validated for _, validated in self.valid_items]
+
+
+class UserSerializer(TimedDataMixin, serializers.ModelSerializer):
+    _id = ObjectIdField()
 
     class Meta:
         model = User
         fields = ['_id', 'username', 'name', 'email', 'password']
-
-    def get__id(self, obj):
-        return str(obj._id) if obj._id else None
+        list_serializer_class = FastListSerializer
 
 
-class TeamSerializer(serializers.ModelSerializer):
-    _id = serializers.SerializerMethodField()
-    members = ListField()
+class TeamSerializer(TimedDataMixin, serializers.ModelSerializer):
+    _id = ObjectIdField()
+    members = MembersField()
 
     class Meta:
         model = Team
         fields = ['_id', 'name', 'members']
-
-    def get__id(self, obj):
-        return str(obj._id) if obj._id else None
+        list_serializer_class = FastListSerializer
 
 
-class ActivitySerializer(serializers.ModelSerializer):
-    _id = serializers.SerializerMethodField()
+class ActivitySerializer(TimedDataMixin, serializers.ModelSerializer):
+    _id = ObjectIdField()
 
     class Meta:
         model = Activity
         fields = ['_id', 'username', 'activity_type', 'duration', 'date']
+        list_serializer_class = PartialListSerializer
 
-    def get__id(self, obj):
-        return str(obj._id) if obj._id else None
 
-
-class LeaderboardSerializer(serializers.ModelSerializer):
-    _id = serializers.SerializerMethodField()
+class LeaderboardSerializer(TimedDataMixin, serializers.ModelSerializer):
+    _id = ObjectIdField()
 
     class Meta:
         model = Leaderboard
         fields = ['_id', 'username', 'score', 'calories']
-
-    def get__id(self, obj):
-        return str(obj._id) if obj._id else None
+        list_serializer_class = FastListSerializer
 
 
-class WorkoutSerializer(serializers.ModelSerializer):
-    _id = serializers.SerializerMethodField()
+class WorkoutSerializer(TimedDataMixin, serializers.ModelSerializer):
+    _id = ObjectIdField()
+    exercises = ListField()
 
     class Meta:
         model = Workout
         fields = ['_id', 'name', 'description', 'exercises']
-
-    def get__id(self, obj):
-        return str(obj._id) if obj._id else None
-
-
-
+        list_serializer_class = FastListSerializer
@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack.
+    'octofit_tracker.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -70,6 +72,29 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_ALL_METHODS = True
 CORS_ALLOW_ALL_HEADERS = True
 
+# Django REST framework
+# List endpoints page through MongoDB with an opaque cursor keyed on _id.
+# OCTOFIT_ORJSON=1 renders JSON with orjson (pip install orjson), which is
+# several times faster on large pages.
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'octofit_tracker.pagination.ObjectIdCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('OCTOFIT_PAGE_SIZE', 100)),
+    'DEFAULT_RENDERER_CLASSES': [
+        'octofit_tracker.renderers.ORJSONRenderer' if os.environ.get('OCTOFIT_ORJSON') == '1'
+        else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Maximum number of activities accepted by one /api/activities/bulk/ request.
+OCTOFIT_BULK_MAX_ITEMS = int(os.environ.get('OCTOFIT_BULK_MAX_ITEMS', 10000))
+
+# Requests slower than this many milliseconds are logged with the MongoDB
+# commands they issued. Unset disables the slow-request log.
+OCTOFIT_SLOW_REQUEST_MS = (
+    float(os.environ['OCTOFIT_SLOW_REQUEST_MS']) if os.environ.get('OCTOFIT_SLOW_REQUEST_MS') else None
+)
+
 ROOT_URLCONF = 'octofit_tracker.urls'
 
 TEMPLATES = [
@@ -94,19 +119,74 @@ WSGI_APPLICATION = 'octofit_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# MongoDB client options, passed straight to pymongo.MongoClient (and to
+# motor for the async endpoints). Every worker process gets its own pool, so
+# total connections are workers * OCTOFIT_MONGO_MAX_POOL_SIZE.
+#   OCTOFIT_MONGO_MAX_POOL_SIZE     max connections per server (pymongo default 100)
+#   OCTOFIT_MONGO_MIN_POOL_SIZE     connections kept open while idle
+#   OCTOFIT_MONGO_WAIT_QUEUE_TIMEOUT_MS  how long a request waits for a free connection
+#   OCTOFIT_MONGO_COMPRESSORS       wire compression, e.g. "zstd,snappy,zlib"
+#   OCTOFIT_MONGO_READ_PREFERENCE   e.g. "secondaryPreferred" to offload reads
+#   OCTOFIT_MONGO_SOCKET_TIMEOUT_MS / OCTOFIT_MONGO_CONNECT_TIMEOUT_MS /
+#   OCTOFIT_MONGO_SERVER_SELECTION_TIMEOUT_MS
+MONGO_CLIENT_OPTIONS = {
+    'maxPoolSize': int(os.environ.get('OCTOFIT_MONGO_MAX_POOL_SIZE', 100)),
+    'minPoolSize': int(os.environ.get('OCTOFIT_MONGO_MIN_POOL_SIZE', 0)),
+    'waitQueueTimeoutMS': int(os.environ.get('OCTOFIT_MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+    'socketTimeoutMS': int(os.environ.get('OCTOFIT_MONGO_SOCKET_TIMEOUT_MS', 30000)),
+    'connectTimeoutMS': int(os.environ.get('OCTOFIT_MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'serverSelectionTimeoutMS': int(os.environ.get('OCTOFIT_MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'readPreference': os.environ.get('OCTOFIT_MONGO_READ_PREFERENCE', 'primary'),
+}
+if os.environ.get('OCTOFIT_MONGO_COMPRESSORS'):
+    MONGO_CLIENT_OPTIONS['compressors'] = os.environ['OCTOFIT_MONGO_COMPRESSORS']
+
 DATABASES = {
     'default': {
         'ENGINE': 'djongo',
         'NAME': 'octofit_db',
         'ENFORCE_SCHEMA': False,
         'CLIENT': {
-            'host': 'localhost',
-            'port': 27017,
+            'host': os.environ.get('OCTOFIT_MONGO_HOST', 'localhost'),
+            'port': int(os.environ.get('OCTOFIT_MONGO_PORT', 27017)),
+            **MONGO_CLIENT_OPTIONS,
         }
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Local memory is per process. With several workers, point
+# OCTOFIT_CACHE_BACKEND at a shared backend so invalidations reach every
+# worker, e.g. django.core.cache.backends.filebased.FileBasedCache with a
+# directory or django.core.cache.backends.redis.RedisCache with a redis:// URL.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('OCTOFIT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('OCTOFIT_CACHE_LOCATION', 'octofit'),
+    }
+}
+
+# Seconds a cached API response may be served before it is rebuilt.
+OCTOFIT_CACHE_TIMEOUT = int(os.environ.get('OCTOFIT_CACHE_TIMEOUT', 300))
+
+# Per-process LRU of documents served by detail routes (see objectcache.py):
+# how many to keep (0 disables it) and for how many seconds. Writes in other
+# processes are only seen once an entry expires.
+OCTOFIT_OBJECT_CACHE_SIZE = int(os.environ.get('OCTOFIT_OBJECT_CACHE_SIZE', 10000))
+OCTOFIT_OBJECT_CACHE_TTL = float(os.environ.get('OCTOFIT_OBJECT_CACHE_TTL', 5))
+
+# How often, in seconds, the in-process leaderboard ranking (see ranking.py)
+# picks up rows written by other processes.
+OCTOFIT_RANKING_REFRESH_SECONDS = float(os.environ.get('OCTOFIT_RANKING_REFRESH_SECONDS', 1))
+
+# How often, in seconds, a process with open leaderboard streams (see
+# streaming.py) polls change_seq for writes made by any process.
+OCTOFIT_FEED_POLL_SECONDS = float(os.environ.get('OCTOFIT_FEED_POLL_SECONDS', 1))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -0,0 +1,87 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import caching, changes, leaderboard, rollups, search
+from .changefeed import feed
+from .objectcache import object_cache
+from .models import User, Team, Activity, Leaderboard
+from .ranking import ranking
+
+
+def _activity_state(activity):
+    return (activity.username, activity.activity_type, activity.date, activity.duration)
+
+
+@receiver(pre_save, sender=Activity)
+def remember_previous_activity(sender, instance, **kwargs):
+    """Capture the stored activity so post_save can apply deltas."""
+    instance._previous_state = None
+    if instance._id is None:
+        return
+    previous = Activity.objects.mongo_find_one(
+        {'_id': instance._id},
+        {'username': 1, 'activity_type': 1, 'date': 1, 'duration': 1},
+    )
+    if previous is not None:
+        instance._previous_state = (
+            previous.get('username'), previous.get('activity_type'),
+            previous.get('date'), previous.get('duration'),
+        )
+
+
+@receiver(post_save, sender=Activity)
+def update_derived_data_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    current = _activity_state(instance)
+    leaderboard.apply_activity_change(
+        previous and (previous[0], previous[3]), (instance.username, instance.duration)
+    )
+    rollups.apply_activity_change(previous, current)
+
+
+@receiver(post_delete, sender=Activity)
+def update_derived_data_on_delete(sender, instance, **kwargs):
+    leaderboard.apply_activity_change((instance.username, instance.duration), None)
+    rollups.apply_activity_change(_activity_state(instance), None)
+
+
+@receiver(post_save, sender=Leaderboard)
+def invalidate_ranking_on_save(sender, instance, **kwargs):
+    # Direct edits may rename or rescore a row; reload rather than guess.
+    ranking.invalidate()
+    feed.publish({'type': 'resync'})
+
+
+@receiver(post_delete, sender=Leaderboard)
+def remove_from_ranking(sender, instance, **kwargs):
+    ranking.remove(instance.username)
+    feed.publish({'type': 'resync'})
+
+
+@receiver(pre_save)
+def stamp_change(sender, instance, **kwargs):
+    if sender in changes.SYNCED_MODELS:
+        changes.stamp_instance(instance)
+
+
+@receiver(pre_save)
+def update_search_terms(sender, instance, **kwargs):
+    if sender in search.SEARCH_FIELDS:
+        search.index_instance(instance)
+
+
+@receiver(post_delete)
+def record_deletion(sender, instance, **kwargs):
+    if sender in changes.SYNCED_MODELS:
+        changes.record_deletion(sender, instance._id)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    if sender in changes.SYNCED_MODELS:
+        caching.invalidate(sender)
+        object_cache.invalidate(sender, instance._id)
+    if sender is User:
+        # Teams embed user details with ?expand=members.
+        caching.invalidate(Team)
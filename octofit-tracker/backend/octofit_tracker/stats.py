@@ -0,0 +1,73 @@
+"""Server-side activity aggregation.
+
+Statistics are computed by one MongoDB aggregation pipeline, so the response
+grows with the number of groups rather than the number of activities. When
+the daily rollups cover the requested range the pipeline runs over them
+instead of the raw activities.
+"""
+from . import rollups
+from .models import Activity, ActivityDailyRollup, to_midnight
+
+GROUP_FIELDS = ('username', 'activity_type')
+
+# $dateToString formats; %G-W%V is the ISO week, e.g. 2024-W02.
+BUCKET_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%G-W%V',
+    'month': '%Y-%m',
+}
+
+
+def _match(date_from=None, date_to=None, username=None):
+    match = {}
+    if date_from or date_to:
+        match['date'] = {}
+        if date_from:
+            match['date']['$gte'] = to_midnight(date_from)
+        if date_to:
+            match['date']['$lte'] = to_midnight(date_to)
+    if username:
+        match['username'] = username
+    return match
+
+
+def _stats_pipeline(match, group_by, bucket, duration='$duration', count=1):
+    group_id = {field: f'${field}' for field in group_by}
+    if bucket:
+        group_id['period'] = {'$dateToString': {'format': BUCKET_FORMATS[bucket], 'date': '$date'}}
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': group_id,
+            'total_duration': {'$sum': duration},
+            'count': {'$sum': count},
+        }},
+        {'$sort': {f'_id.{key}': 1 for key in group_id}} if group_id else {'$sort': {'_id': 1}},
+    ]
+
+
+def _row(group, total_duration, count):
+    row = dict(group)
+    row['total_duration'] = total_duration
+    row['count'] = count
+    row['average_duration'] = total_duration / count if count else 0
+    return row
+
+
+def activity_stats(group_by=GROUP_FIELDS, bucket=None, date_from=None, date_to=None, username=None):
+    """Return total duration, count and average per group.
+
+    ``group_by`` is a subset of ``GROUP_FIELDS``; ``bucket`` is ``None`` or a
+    key of ``BUCKET_FORMATS``.
+    """
+    match = _match(date_from, date_to, username)
+    if rollups.covers(date_from):
+        source = ActivityDailyRollup
+        pipeline = _stats_pipeline(match, group_by, bucket, duration='$total_duration', count='$count')
+    else:
+        source = Activity
+        pipeline = _stats_pipeline(match, group_by, bucket)
+    return [
+        _row(row['_id'], row['total_duration'], row['count'])
+        for row in source.objects.mongo_aggregate(pipeline, allowDiskUse=True)
+    ]
@@ -0,0 +1,166 @@
+"""Live leaderboard stream served straight from ``asgi.py``.
+
+``/api/stream/leaderboard/`` speaks server-sent events over HTTP and JSON
+frames over WebSocket. Each connection first gets a ``snapshot`` of the top
+``?n=`` rows (default 100), then the change-feed events (see
+``changefeed.py``) as they happen. SSE sends one event per change; WebSocket
+sends one JSON array per batch.
+
+While any connection is open, one task per process polls ``change_seq``
+every ``OCTOFIT_FEED_POLL_SECONDS``. It refreshes the ranking, which
+publishes the score changes it had not seen (see ``ranking.py``), and
+publishes the activities changed since the last poll. Writes made by other
+processes therefore reach the stream too, once they have settled.
+
+Each connection drains its subscription only after the previous send has
+completed. While a slow client is being written to, new changes coalesce in
+its bounded buffer instead of queueing in the server. Runs only under an
+ASGI server such as uvicorn or daphne; ``runserver`` is WSGI.
+"""
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from pymongo import DESCENDING
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import changes
+from .changefeed import feed
+from .models import Activity
+from .ranking import ranking
+from .repository import REPOSITORIES
+
+STREAM_PATH = '/api/stream/leaderboard/'
+HEARTBEAT_SECONDS = 15
+MAX_TOP = 100
+# At most this many activities are published per poll; the rest wait.
+POLL_LIMIT = 1000
+
+logger = logging.getLogger(__name__)
+_poller = None
+
+
+def _top_n(scope):
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    try:
+        n = int(query.get('n', [MAX_TOP])[0])
+    except ValueError:
+        n = MAX_TOP
+    return max(1, min(n, MAX_TOP))
+
+
+def _dumps(data):
+    return json.dumps(data, cls=JSONEncoder)
+
+
+def _poll_once(since):
+    """Publish what changed after token ``since``; return the next token.
+
+    With ``since=None`` the token starts at the latest activity, since the
+    streams' clients have just fetched the list.
+    """
+    ranking.poll()
+    if since is None:
+        row = Activity.objects.mongo_find_one({}, {'change_seq': 1}, sort=[('change_seq', DESCENDING)])
+        return (row or {}).get('change_seq') or 0
+    change = changes.delta(REPOSITORIES['activities'].all(), since, POLL_LIMIT)
+    for activity in change['results']:
+        feed.publish({'type': 'activity', 'activity': activity})
+    return int(change['token'])
+
+
+async def _poll():
+    since = None
+    while feed:
+        try:
+            since = await sync_to_async(_poll_once)(since)
+        except Exception:
+            logger.exception('Polling for leaderboard stream changes failed.')
+        await asyncio.sleep(settings.OCTOFIT_FEED_POLL_SECONDS)
+
+
+def _start_polling():
+    global _poller
+    loop = asyncio.get_running_loop()
+    if _poller is None or _poller.done() or _poller.get_loop() is not loop:
+        _poller = loop.create_task(_poll())
+
+
+def _stop_polling():
+    if _poller is not None and not feed:
+        _poller.cancel()
+
+
+async def _events(scope, disconnected):
+    """Yield lists of events until ``disconnected`` completes.
+
+    An empty list means nothing happened for ``HEARTBEAT_SECONDS``.
+    """
+    subscription = feed.subscribe()
+    _start_polling()
+    try:
+        top = await sync_to_async(ranking.top)(_top_n(scope))
+        yield [{'type': 'snapshot', 'top': top}]
+        while not disconnected.done():
+            woken = asyncio.ensure_future(subscription.wait())
+            await asyncio.wait({woken, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if disconnected.done():
+                return
+            yield subscription.drain()
+    finally:
+        feed.unsubscribe(subscription)
+        _stop_polling()
+
+
+async def _wait_for(receive, message_type):
+    while (await receive())['type'] != message_type:
+        pass
+
+
+async def _server_sent_events(scope, receive, send):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            # This bypasses CorsMiddleware, which allows every origin.
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    disconnected = asyncio.ensure_future(_wait_for(receive, 'http.disconnect'))
+    try:
+        async for events in _events(scope, disconnected):
+            if events:
+                body = ''.join(f"event: {event['type']}\ndata: {_dumps(event)}\n\n" for event in events)
+            else:
+                body = ': keep-alive\n\n'
+            await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+    finally:
+        disconnected.cancel()
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _websocket(scope, receive, send):
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+    disconnected = asyncio.ensure_future(_wait_for(receive, 'websocket.disconnect'))
+    try:
+        async for events in _events(scope, disconnected):
+            if events:
+                await send({'type': 'websocket.send', 'text': _dumps(events)})
+    finally:
+        disconnected.cancel()
+
+
+async def leaderboard_stream(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await _websocket(scope, receive, send)
+    else:
+        await _server_sent_events(scope, receive, send)
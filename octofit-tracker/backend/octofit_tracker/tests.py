@@ -1,8 +1,35 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from rest_framework import status
-from .models import User, Team, Activity, Leaderboard, Workout
-from datetime import date
+from bson import ObjectId
+from .models import User, Team, Activity, Leaderboard, Workout, ActivityDailyRollup, JobCheckpoint, Tombstone
+from . import changes, indexes, jobs, leaderboard, rollups, search, stats
+from .caching import not_modified_since
+from .changefeed import ChangeFeed, feed
+from .metrics import Histogram, RequestStats, command_metrics, registry, _current
+from .objectcache import ObjectCache, instance_from_document, object_cache
+from .pagination import ObjectIdCursorPagination
+from .pool import PoolMetrics
+from .ranking import LeaderboardRanking, ranking
+from .renderers import ORJSONRenderer, orjson
+from .repository import REPOSITORIES
+from .serializers import (
+    UserSerializer, TeamSerializer, ActivitySerializer, LeaderboardSerializer, WorkoutSerializer, ListField
+)
+from .streaming import leaderboard_stream
+import asyncio
+import json
+import os
+import time
+import unittest
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
 
 class UserModelTest(TestCase):
@@ -127,3 +154,1101 @@ class APIEndpointTest(TestCase):
     def test_workouts_endpoint(self):
         response = self.client.get('/api/workouts/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for day in range(1, 6):
+            Activity.objects.create(
+                username='ironman',
+                activity_type='flight training',
+                duration=float(day),
+                date=date(2024, 1, day),
+            )
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+
+    def test_cursor_pages_cover_collection_once(self):
+        seen = []
+        url = '/api/activities/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(item['_id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_rows_sharing_a_date_are_paged_without_offsets(self):
+        for _ in range(4):
+            Activity.objects.create(username='ironman', activity_type='repulsor test', duration=1.0,
+                                    date=date(2024, 1, 3))
+        seen = []
+        url = '/api/activities/?username=ironman&page_size=2'
+        # DRF would page through the ties with an offset capped at offset_cutoff.
+        with mock.patch.object(ObjectIdCursorPagination, 'offset_cutoff', 1):
+            while url:
+                response = self.client.get(url)
+                seen.extend(item['_id'] for item in response.data['results'])
+                url = response.data['next']
+            self.assertEqual(len(seen), 9)
+            self.assertEqual(len(set(seen)), 9)
+            previous = self.client.get(response.data['previous']).data['results']
+        self.assertEqual([item['_id'] for item in previous], seen[-3:-1])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/activities/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LeaderboardEngineTest(TestCase):
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+
+    def _entry(self, username):
+        return Leaderboard.objects.get(username=username)
+
+    def test_activity_create_increments_leaderboard(self):
+        Activity.objects.create(username='thor', activity_type='hammer lifting', duration=50.0, date=date(2024, 1, 13))
+        Activity.objects.create(username='thor', activity_type='flying', duration=10.0, date=date(2024, 1, 14))
+        entry = self._entry('thor')
+        self.assertEqual(entry.score, 600)
+        self.assertEqual(entry.calories, 480)
+
+    def test_activity_update_applies_delta(self):
+        activity = Activity.objects.create(username='thor', activity_type='flying', duration=10.0, date=date(2024, 1, 14))
+        activity.duration = 15.0
+        activity.save()
+        self.assertEqual(self._entry('thor').score, 150)
+
+    def test_activity_update_moves_points_between_users(self):
+        activity = Activity.objects.create(username='thor', activity_type='flying', duration=10.0, date=date(2024, 1, 14))
+        activity.username = 'loki'
+        activity.save()
+        self.assertEqual(self._entry('thor').score, 0)
+        self.assertEqual(self._entry('loki').score, 100)
+
+    def test_activity_delete_decrements_leaderboard(self):
+        activity = Activity.objects.create(username='thor', activity_type='flying', duration=10.0, date=date(2024, 1, 14))
+        activity.delete()
+        self.assertEqual(self._entry('thor').score, 0)
+        self.assertEqual(self._entry('thor').calories, 0)
+
+    def test_rebuild_matches_incremental_totals(self):
+        Activity.objects.create(username='thor', activity_type='flying', duration=12.5, date=date(2024, 1, 14))
+        Activity.objects.create(username='loki', activity_type='flying', duration=3.0, date=date(2024, 1, 14))
+        Leaderboard.objects.mongo_update_many({}, {'$set': {'score': 0, 'calories': 0}})
+        self.assertEqual(leaderboard.rebuild(), 2)
+        self.assertEqual(self._entry('thor').score, 125)
+        self.assertEqual(self._entry('loki').calories, 24)
+
+
+class RankingRefreshTest(SimpleTestCase):
+    def test_unsettled_rows_are_read_again(self):
+        now = timezone.now()
+        rows = [
+            {'username': 'thor', 'score': 10, 'change_seq': 4, 'updated_at': now - timedelta(seconds=5)},
+            {'username': 'loki', 'score': 30, 'change_seq': 5, 'updated_at': now},
+            {'username': 'hela', 'score': 20, 'change_seq': 6, 'updated_at': now - timedelta(seconds=5)},
+        ]
+        view = LeaderboardRanking(refresh_seconds=0)
+        self.assertEqual(view._apply_rows(rows, 0), 4)
+        self.assertEqual([row['username'] for row in map(view._row, range(3))], ['loki', 'hela', 'thor'])
+
+    def test_older_revisions_are_ignored(self):
+        view = LeaderboardRanking(refresh_seconds=60)
+        view._loaded, view._checked = True, time.monotonic()
+        # Two deltas whose writes landed in one order and returned in the other.
+        view.update('thor', 20, 16, revision=2)
+        view.update('thor', 10, 8, revision=1)
+        self.assertEqual(view.rank('thor'), {'rank': 1, 'username': 'thor', 'score': 20, 'calories': 16})
+        view.update('thor', 0, 0, revision=2)
+        self.assertEqual(view.rank('thor')['score'], 0)
+
+    async def test_each_revision_is_published_once(self):
+        view = LeaderboardRanking(refresh_seconds=60)
+        view._loaded, view._checked = True, time.monotonic()
+        live = ChangeFeed()
+        subscription = live.subscribe()
+        settled = timezone.now() - timedelta(seconds=5)
+        with mock.patch('octofit_tracker.ranking.feed', live):
+            view.update('thor', 10, 8, revision=1)
+            # A refresh reads thor's row back and a row another process wrote.
+            events = []
+            view._apply_rows([
+                {'username': 'thor', 'score': 10, 'calories': 8, 'revision': 1, 'change_seq': 7, 'updated_at': settled},
+                {'username': 'loki', 'score': 30, 'revision': 1, 'change_seq': 8, 'updated_at': settled},
+            ], 0, events)
+            view._publish(events)
+        self.assertEqual([(event['username'], event['delta'], event['rank']) for event in subscription.drain()],
+                         [('thor', 10, 1), ('loki', 30, 1)])
+
+
+class ActivityPointsTest(SimpleTestCase):
+    def test_points_scale_with_duration(self):
+        self.assertEqual(leaderboard.activity_points(45.0), (450, 360))
+
+    def test_missing_duration_scores_nothing(self):
+        self.assertEqual(leaderboard.activity_points(None), (0, 0))
+
+
+class LeaderboardRankingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for username, score in [('ironman', 950), ('batman', 940), ('superman', 990), ('thor', 940)]:
+            Leaderboard.objects.create(username=username, score=score)
+        ranking.invalidate()
+
+    def tearDown(self):
+        Leaderboard.objects.all().delete()
+        ranking.invalidate()
+
+    def test_top_returns_highest_scores_first(self):
+        response = self.client.get('/api/leaderboard/top/?n=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['username'] for row in response.data], ['superman', 'ironman'])
+        self.assertEqual([row['rank'] for row in response.data], [1, 2])
+
+    def test_tied_scores_share_rank(self):
+        response = self.client.get('/api/leaderboard/rank/thor/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rank'], 3)
+        self.assertEqual(self.client.get('/api/leaderboard/rank/batman/').data['rank'], 3)
+
+    def test_rank_follows_activity_writes(self):
+        ranking.top(1)
+        Activity.objects.create(username='batman', activity_type='cape gliding', duration=10.0, date=date(2024, 1, 10))
+        self.assertEqual(self.client.get('/api/leaderboard/rank/batman/').data['rank'], 1)
+        Activity.objects.all().delete()
+
+    def test_rank_follows_writes_from_other_processes(self):
+        ranking.top(1)
+        with mock.patch.object(ranking, 'refresh_seconds', 0):
+            Leaderboard.objects.mongo_update_one(
+                {'username': 'batman'}, changes.stamp_update({'$set': {'score': 1000}})
+            )
+            self.assertEqual(ranking.rank('batman')['rank'], 1)
+            row = Leaderboard.objects.mongo_find_one_and_delete({'username': 'superman'})
+            changes.record_deletion(Leaderboard, row['_id'])
+            self.assertIsNone(ranking.rank('superman'))
+
+    def test_unknown_user_rank_is_404(self):
+        response = self.client.get('/api/leaderboard/rank/nobody/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_n_is_rejected(self):
+        response = self.client.get('/api/leaderboard/top/?n=ten')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IndexSyncTest(TestCase):
+    def test_sync_leaves_no_drift(self):
+        for model in indexes.indexed_models():
+            indexes.sync_indexes(model)
+            missing, changed, _ = indexes.diff_indexes(model)
+            self.assertEqual((missing, changed), ([], []), model.__name__)
+
+    def test_declared_activity_history_index(self):
+        keys = [list(index.document['key'].items()) for index in Activity.mongo_indexes]
+        self.assertIn([('username', 1), ('date', -1), ('_id', -1)], keys)
+
+
+class PopulateDbCommandTest(TestCase):
+    def tearDown(self):
+        for model in (User, Team, Activity, Leaderboard, Workout):
+            model.objects.mongo_delete_many({})
+
+    def test_generates_requested_volume(self):
+        out = StringIO()
+        call_command('populate_db', users=15, activities_per_user=3, seed=7, chunk_size=4, stdout=out)
+        self.assertEqual(User.objects.count(), 15)
+        self.assertEqual(Activity.objects.count(), 45)
+        self.assertEqual(Leaderboard.objects.count(), 15)
+        self.assertIn('docs/s', out.getvalue())
+
+    def test_default_run_keeps_superhero_data(self):
+        call_command('populate_db', stdout=StringIO())
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Leaderboard.objects.get(username='superman').score, 550)
+
+
+class CachedResponseTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.workout = Workout.objects.create(
+            name='Spider Agility Circuit',
+            description='Agility and reflexes training.',
+            exercises=['wall crawl simulation'],
+        )
+
+    def tearDown(self):
+        Workout.objects.all().delete()
+
+    def test_matching_etag_returns_not_modified(self):
+        response = self.client.get('/api/workouts/')
+        etag = response['ETag']
+        response = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_write_through_viewset_invalidates_list(self):
+        etag = self.client.get('/api/workouts/')['ETag']
+        self.client.patch(f'/api/workouts/{self.workout._id}/', {'name': 'Web Slinger Circuit'}, format='json')
+        response = self.client.get('/api/workouts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['name'], 'Web Slinger Circuit')
+
+
+class ActivityStatsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for username, activity_type, duration, day in [
+            ('ironman', 'flight training', 45.0, date(2024, 1, 10)),
+            ('ironman', 'flight training', 15.0, date(2024, 1, 11)),
+            ('ironman', 'boxing', 30.0, date(2024, 2, 1)),
+            ('thor', 'hammer lifting', 50.0, date(2024, 1, 13)),
+        ]:
+            Activity.objects.create(username=username, activity_type=activity_type, duration=duration, date=day)
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+
+    def test_groups_by_user_and_type(self):
+        response = self.client.get('/api/activities/stats/?username=ironman')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = {row['activity_type']: row for row in response.data}
+        self.assertEqual(rows['flight training']['total_duration'], 60.0)
+        self.assertEqual(rows['flight training']['count'], 2)
+        self.assertEqual(rows['flight training']['average_duration'], 30.0)
+
+    def test_monthly_bucket_with_date_range(self):
+        response = self.client.get('/api/activities/stats/?group_by=username&bucket=month&date_to=2024-01-31')
+        periods = {(row['username'], row['period']): row['count'] for row in response.data}
+        self.assertEqual(periods, {('ironman', '2024-01'): 2, ('thor', '2024-01'): 1})
+
+    def test_rejects_unknown_bucket(self):
+        response = self.client.get('/api/activities/stats/?bucket=hour')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityRollupTest(TestCase):
+    def setUp(self):
+        self.activity = Activity.objects.create(
+            username='ironman', activity_type='flight training', duration=45.0, date=date(2024, 1, 10),
+        )
+        Activity.objects.create(username='ironman', activity_type='flight training', duration=15.0, date=date(2024, 1, 10))
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+        rollups.clear()
+
+    def _rollup(self):
+        return ActivityDailyRollup.objects.get(username='ironman', activity_type='flight training', date=date(2024, 1, 10))
+
+    def test_writes_keep_rollup_current(self):
+        rollup = self._rollup()
+        self.assertEqual((rollup.total_duration, rollup.count), (60.0, 2))
+        self.activity.date = date(2024, 1, 11)
+        self.activity.save()
+        self.assertEqual(self._rollup().count, 1)
+
+    def test_deleting_last_activity_removes_rollup(self):
+        Activity.objects.all().delete()
+        self.assertFalse(ActivityDailyRollup.objects.exists())
+
+    def test_coverage_follows_refresh(self):
+        self.assertFalse(rollups.covers(date(2024, 1, 1)))
+        rollups.refresh(since=date(2024, 1, 5))
+        self.assertTrue(rollups.covers(date(2024, 1, 5)))
+        self.assertFalse(rollups.covers(None))
+        rollups.refresh()
+        self.assertTrue(rollups.covers(None))
+
+    def test_stats_from_rollups_match_raw_activities(self):
+        raw = stats.activity_stats(bucket='day')
+        rollups.refresh()
+        self.assertEqual(stats.activity_stats(bucket='day'), raw)
+
+
+class ListFieldTest(SimpleTestCase):
+    def test_native_list_is_returned_as_is(self):
+        members = ['ironman', 'thor']
+        self.assertIs(ListField().to_representation(members), members)
+
+    def test_legacy_strings_are_parsed(self):
+        self.assertEqual(ListField().to_representation('["ironman", "thor"]'), ['ironman', 'thor'])
+        self.assertEqual(ListField().to_representation("['ironman', 'thor']"), ['ironman', 'thor'])
+
+    def test_malformed_string_becomes_empty_list(self):
+        self.assertEqual(ListField().to_representation('not a list'), [])
+
+
+class TeamMemberExpansionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create(username='ironman', name='Tony Stark', email='tony@stark.com', password='pepper123')
+        Team.objects.create(name='Team Marvel', members=['ironman', 'ghost'])
+
+    def tearDown(self):
+        User.objects.all().delete()
+        Team.objects.all().delete()
+
+    def test_members_are_plain_usernames_by_default(self):
+        response = self.client.get('/api/teams/')
+        self.assertEqual(response.data['results'][0]['members'], ['ironman', 'ghost'])
+
+    def test_expand_embeds_member_details(self):
+        response = self.client.get('/api/teams/?expand=members')
+        ironman, ghost = response.data['results'][0]['members']
+        self.assertEqual(ironman['name'], 'Tony Stark')
+        self.assertNotIn('password', ironman)
+        self.assertEqual(ghost, {'username': 'ghost'})
+
+
+class BulkActivityIngestTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+        rollups.clear()
+
+    def test_json_array_is_inserted(self):
+        payload = [
+            {'username': 'thor', 'activity_type': 'flying', 'duration': 10.0, 'date': '2024-01-14'},
+            {'username': 'thor', 'activity_type': 'flying', 'duration': 5.0, 'date': '2024-01-14'},
+        ]
+        response = self.client.post('/api/activities/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'inserted': 2, 'errors': []})
+        self.assertEqual(Leaderboard.objects.get(username='thor').score, 150)
+        self.assertEqual(ActivityDailyRollup.objects.get(username='thor').count, 2)
+
+    def test_invalid_rows_are_reported_without_rollback(self):
+        body = (
+            '{"username": "thor", "activity_type": "flying", "duration": 10, "date": "2024-01-14"}\n'
+            '{"username": "thor", "duration": "fast"}\n'
+        )
+        response = self.client.post('/api/activities/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['inserted'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertEqual(Activity.objects.count(), 1)
+
+    def test_non_list_payload_is_rejected(self):
+        response = self.client.post('/api/activities/bulk/', {'username': 'thor'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ActivityExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Activity.objects.create(username='ironman', activity_type='flight training', duration=45.0, date=date(2024, 1, 10))
+        Activity.objects.create(username='thor', activity_type='hammer lifting', duration=50.0, date=date(2024, 2, 13))
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+        rollups.clear()
+
+    def test_ndjson_export_streams_one_line_per_activity(self):
+        response = self.client.get('/api/activities/export/?format=ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['username'] for line in lines], ['ironman', 'thor'])
+
+    def test_csv_export_honours_since(self):
+        response = self.client.get('/api/activities/export/?format=csv&since=2024-02-01')
+        rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], '_id,username,activity_type,duration,date')
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[1].endswith('thor,hammer lifting,50.0,2024-02-13'))
+
+
+class AsyncReadEndpointTest(TestCase):
+    def setUp(self):
+        self.activity = Activity.objects.create(
+            username='ironman', activity_type='flight training', duration=45.0, date=date(2024, 1, 10),
+        )
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+        rollups.clear()
+
+    async def test_detail_matches_sync_serializer(self):
+        response = await AsyncClient().get(f'/api/async/activities/{self.activity._id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            '_id': str(self.activity._id),
+            'username': 'ironman',
+            'activity_type': 'flight training',
+            'duration': 45.0,
+            'date': '2024-01-10',
+        })
+
+    async def test_list_uses_cursor_envelope(self):
+        response = await AsyncClient().get('/api/async/activities/?page_size=1')
+        body = response.json()
+        self.assertEqual(len(body['results']), 1)
+        self.assertIsNone(body['next'])
+
+    async def test_db_commands_are_charged_to_the_request(self):
+        # Motor's executor threads must see the request's metrics context.
+        def commands():
+            series = registry._series.get(('async-detail', 'GET'))
+            return series['db_commands'].sum if series else 0
+
+        before = commands()
+        await AsyncClient().get(f'/api/async/activities/{self.activity._id}/')
+        self.assertGreater(commands(), before)
+
+    async def test_unknown_resource_is_404(self):
+        response = await AsyncClient().get('/api/async/nothing/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PoolMetricsTest(SimpleTestCase):
+    address = ('localhost', 27017)
+
+    def _event(self, **kwargs):
+        return type('Event', (), dict(address=self.address, **kwargs))()
+
+    def test_tracks_checkouts_and_peak(self):
+        metrics = PoolMetrics()
+        metrics.pool_created(self._event(options={'maxPoolSize': 5}))
+        for _ in range(3):
+            metrics.connection_check_out_started(self._event())
+            metrics.connection_checked_out(self._event(connection_id=1))
+        metrics.connection_checked_in(self._event(connection_id=1))
+        stats = metrics.snapshot()['localhost:27017']
+        self.assertEqual(stats['max_pool_size'], 5)
+        self.assertEqual((stats['in_use'], stats['peak_in_use'], stats['checkouts']), (2, 3, 3))
+
+    def test_counts_checkout_timeouts(self):
+        metrics = PoolMetrics()
+        metrics.connection_check_out_started(self._event())
+        metrics.connection_check_out_failed(self._event(reason='timeout'))
+        self.assertEqual(metrics.snapshot()['localhost:27017']['timeouts'], 1)
+
+
+class RequestMetricsTest(SimpleTestCase):
+    def test_histogram_is_cumulative(self):
+        histogram = Histogram((0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value)
+        self.assertEqual(list(histogram.cumulative()), [(0.1, 1), (1, 3), (float('inf'), 4)])
+        self.assertEqual(histogram.count, 4)
+
+    def test_commands_are_charged_to_the_current_request(self):
+        stats = RequestStats(capture_commands=True)
+        token = _current.set(stats)
+        try:
+            event = type('Event', (), dict(
+                command={'find': 'activities'}, command_name='find',
+                database_name='octofit_db', duration_micros=2500,
+            ))()
+            command_metrics.started(event)
+            command_metrics.succeeded(event)
+        finally:
+            _current.reset(token)
+        self.assertEqual((stats.db_commands, stats.db_seconds), (1, 0.0025))
+        self.assertEqual(stats.commands, ['octofit_db.find {"find": "activities"}'])
+
+    def test_metrics_endpoint_reports_routes(self):
+        self.client.get('/metrics')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('octofit_requests_total{route="metrics",method="GET",status="200"}', body)
+        self.assertIn('octofit_request_duration_seconds_bucket{route="metrics",method="GET",le="+Inf"}', body)
+
+
+class RepositoryEncodingTest(SimpleTestCase):
+    def test_documents_encode_like_the_serializer(self):
+        oid = ObjectId()
+        activity = Activity(_id=oid, username='thor', activity_type='hammer lifting', duration=50, date=date(2024, 1, 13))
+        document = {'_id': oid, 'username': 'thor', 'activity_type': 'hammer lifting', 'duration': 50,
+                    'date': datetime(2024, 1, 13)}
+        self.assertEqual(REPOSITORIES['activities'].to_representation(document), ActivitySerializer(activity).data)
+
+        entry = Leaderboard(_id=oid, username='thor', score=500, calories=400)
+        document = {'_id': oid, 'username': 'thor', 'score': 500.0, 'calories': 400}
+        self.assertEqual(json.dumps(REPOSITORIES['leaderboard'].to_representation(document)),
+                         json.dumps(LeaderboardSerializer(entry).data))
+
+    def test_sparse_fieldset_narrows_projection(self):
+        users = REPOSITORIES['users']
+        sparse = users.only(['username'])
+        self.assertEqual(sparse.projection, {'_id': 1, 'username': 1})
+        self.assertEqual(sparse.to_representation({'_id': None, 'username': 'thor', 'password': 'x'}),
+                         {'_id': None, 'username': 'thor'})
+        self.assertIs(users.only(['username', '_id']), sparse)
+        self.assertEqual(len(users.projection), 5)
+
+    def test_ordering_reads_the_sort_key(self):
+        sparse = REPOSITORIES['activities'].only(['username'])
+        query = sparse.all().order_by('-date', '-_id')
+        self.assertEqual(query.repository.projection, {'_id': 1, 'username': 1, 'date': 1})
+        self.assertIs(sparse.all().order_by('_id').repository, sparse)
+
+    def test_cursor_lookups_build_one_query(self):
+        oid = ObjectId()
+        query = REPOSITORIES['users'].all().order_by('-_id').filter(_id__lt=str(oid))
+        self.assertEqual(query.query, {'_id': {'$lt': oid}})
+        self.assertEqual(query.sort, [('_id', -1)])
+
+    def test_keyset_after_breaks_ties_on_id(self):
+        oid = ObjectId()
+        query = REPOSITORIES['activities'].all().filter(username='thor')
+        query = query.after(['date', '_id'], ['2024-01-13', str(oid)], 'lt')
+        self.assertEqual(query.query, {
+            'username': 'thor',
+            'date': {'$lte': datetime(2024, 1, 13)},
+            '$or': [{'date': {'$lt': datetime(2024, 1, 13)}}, {'date': datetime(2024, 1, 13), '_id': {'$lt': oid}}],
+        })
+        self.assertEqual(REPOSITORIES['users'].all().after(['_id'], [str(oid)], 'gt').query, {'_id': {'$gt': oid}})
+
+    def test_lookups_are_coerced_to_stored_types(self):
+        query = REPOSITORIES['activities'].all().filter(
+            username='thor', date__gte=date(2024, 1, 1), date__lte=date(2024, 1, 31)
+        ).filter(date__lt='2024-01-15', duration__gt='30')
+        self.assertEqual(query.query, {
+            'username': 'thor',
+            'date': {'$gte': datetime(2024, 1, 1), '$lte': datetime(2024, 1, 31), '$lt': datetime(2024, 1, 15)},
+            'duration': {'$gt': 30.0},
+        })
+
+
+class RepositoryReadTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.workout = Workout.objects.create(name='Gotham Night Patrol', description='Stealth', exercises=['pull-ups'])
+
+    def tearDown(self):
+        Workout.objects.all().delete()
+
+    def test_retrieve_matches_orm_serializer(self):
+        response = self.client.get(f'/api/workouts/{self.workout._id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, dict(WorkoutSerializer(self.workout).data))
+
+    def test_unknown_id_is_404(self):
+        response = self.client.get(f'/api/workouts/{ObjectId()}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sparse_fieldset(self):
+        response = self.client.get('/api/workouts/?fields=name')
+        self.assertEqual(response.data['results'], [{'_id': str(self.workout._id), 'name': 'Gotham Night Patrol'}])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/workouts/?fields=name,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastListSerializerTest(SimpleTestCase):
+    def _instances(self):
+        oid = ObjectId()
+        return {
+            UserSerializer: [User(_id=oid, username='thor', name='Thor Odinson', email='thor@asgard.com', password='x')],
+            TeamSerializer: [Team(_id=oid, name='Team Marvel', members=['thor', 'ironman']), Team(_id=oid, name='Empty')],
+            ActivitySerializer: [Activity(_id=oid, username='thor', activity_type='hammer lifting', duration=50,
+                                          date=date(2024, 1, 13))],
+            LeaderboardSerializer: [Leaderboard(_id=oid, username='thor', score=500, calories=None)],
+            WorkoutSerializer: [Workout(_id=oid, name='Gotham Night Patrol', description='Stealth', exercises=['a'])],
+        }
+
+    def test_output_is_byte_identical(self):
+        renderer = JSONRenderer()
+        for serializer_class, instances in self._instances().items():
+            with self.subTest(serializer_class.__name__):
+                fast = serializer_class(instances, many=True).data
+                regular = serializers.ListSerializer(instances, child=serializer_class()).data
+                self.assertEqual(renderer.render(fast), renderer.render(regular))
+
+    def test_expanded_members_use_the_fast_path(self):
+        team = Team(_id=ObjectId(), name='Team Marvel', members=['thor'])
+        context = {'expanded_members': {'thor': {'username': 'thor', 'name': 'Thor Odinson'}}}
+        data = TeamSerializer([team], many=True, context=context).data
+        self.assertEqual(data[0]['members'], [{'username': 'thor', 'name': 'Thor Odinson'}])
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {'results': [{'_id': str(ObjectId()), 'username': 'thor', 'score': 500, 'duration': 50.5,
+                             'members': ['thor', 'Tony Stark ✓']}], 'next': None}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class ActivityFilterTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        indexes.sync_indexes(Activity)
+        for username, activity_type, duration, day in [
+            ('thor', 'hammer lifting', 50.0, 13),
+            ('thor', 'flying', 20.0, 14),
+            ('thor', 'flying', 35.0, 15),
+            ('ironman', 'flying', 45.0, 10),
+        ]:
+            Activity.objects.create(username=username, activity_type=activity_type, duration=duration,
+                                    date=date(2024, 1, day))
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+
+    def _results(self, query):
+        response = self.client.get(f'/api/activities/?{query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [(row['username'], row['date'], row['duration']) for row in response.data['results']]
+
+    def test_filtered_history_is_newest_first(self):
+        self.assertEqual(self._results('username=thor&date_from=2024-01-14'), [
+            ('thor', '2024-01-15', 35.0), ('thor', '2024-01-14', 20.0),
+        ])
+
+    def test_ordering_by_duration_pages_through_every_row(self):
+        seen = []
+        url = '/api/activities/?username=thor&ordering=-duration&page_size=1'
+        while url:
+            response = self.client.get(url)
+            seen.extend(row['duration'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [50.0, 35.0, 20.0])
+
+    def test_sparse_fieldset_omits_the_ordering_field(self):
+        for query in ['username=thor&fields=username', 'username=thor&ordering=date&fields=duration']:
+            with self.subTest(query):
+                url = f'/api/activities/?{query}&page_size=1'
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                fields = query.rpartition('=')[2]
+                self.assertEqual(set(response.data['results'][0]), {'_id', fields})
+                self.assertEqual(len(self.client.get(response.data['next']).data['results']), 1)
+
+    def test_duration_ordering_requires_username(self):
+        response = self.client.get('/api/activities/?ordering=duration')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_every_filter_combination_is_index_backed(self):
+        """Flag filter/ordering combinations MongoDB would answer by scanning."""
+        filter_sets = [
+            {}, {'username': 'thor'}, {'activity_type': 'flying'},
+            {'username': 'thor', 'activity_type': 'flying'},
+            {'date__gte': date(2024, 1, 1), 'date__lte': date(2024, 1, 31)},
+            {'username': 'thor', 'date__gte': date(2024, 1, 1)},
+            {'activity_type': 'flying', 'date__lte': date(2024, 1, 31)},
+        ]
+        orderings = [('date', '_id'), ('-date', '-_id'), ('duration', '_id'), ('-duration', '-_id')]
+        unindexed = []
+        for lookups in filter_sets:
+            for ordering in orderings:
+                if ordering[0].lstrip('-') == 'duration' and 'username' not in lookups:
+                    continue  # Rejected by HistoryOrderingFilter.
+                query = REPOSITORIES['activities'].all().filter(**lookups).order_by(*ordering)
+                # The first page and a later page, which resumes after a cursor position.
+                fields = [field.lstrip('-') for field in ordering]
+                position = ['2024-01-14' if fields[0] == 'date' else '20', str(ObjectId())]
+                operator = 'lt' if ordering[0].startswith('-') else 'gt'
+                for page in (query, query.after(fields, position, operator)):
+                    stages = page.explain()
+                    if 'COLLSCAN' in stages or 'SORT' in stages:
+                        unindexed.append((lookups, ordering, page.query, stages))
+        self.assertEqual(unindexed, [])
+
+
+class ChangeFeedTest(SimpleTestCase):
+    def _score(self, username, score, delta, rank, previous_rank):
+        return {'type': 'score', 'username': username, 'score': score, 'calories': 0,
+                'rank': rank, 'delta': delta, 'previous_rank': previous_rank}
+
+    async def test_score_events_coalesce_per_user(self):
+        changes = ChangeFeed()
+        subscription = changes.subscribe()
+        changes.publish(self._score('thor', 100, 100, 2, 3))
+        changes.publish({'type': 'activity', 'activity': {'username': 'thor'}})
+        changes.publish(self._score('thor', 150, 50, 1, 2))
+        await asyncio.wait_for(subscription.wait(), 1)
+        events = subscription.drain()
+        self.assertEqual([event['type'] for event in events], ['activity', 'score'])
+        self.assertEqual((events[1]['score'], events[1]['delta'], events[1]['rank'], events[1]['previous_rank']),
+                         (150, 150, 1, 3))
+        self.assertEqual(subscription.drain(), [])
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        changes = ChangeFeed()
+        subscription = changes.subscribe(max_pending=2)
+        for index in range(3):
+            changes.publish({'type': 'activity', 'activity': {'index': index}})
+        changes.publish(self._score('thor', 100, 100, 1, None))
+        self.assertEqual(subscription.drain(), [{'type': 'resync'}])
+
+    def test_publish_without_subscribers_is_a_no_op(self):
+        changes = ChangeFeed()
+        self.assertFalse(changes)
+        changes.publish({'type': 'resync'})
+
+
+class LeaderboardStreamTest(TestCase):
+    def setUp(self):
+        Leaderboard.objects.create(username='thor', score=500, calories=400)
+        ranking.invalidate()
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+        ranking.invalidate()
+
+    async def test_sse_sends_snapshot_then_score_changes(self):
+        bodies = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] != 'http.response.body' or not message['body']:
+                return
+            bodies.append(message['body'].decode())
+            if len(bodies) == 1:
+                feed.publish({'type': 'score', 'username': 'thor', 'score': 600, 'calories': 480,
+                              'rank': 1, 'delta': 100, 'previous_rank': 1})
+            else:
+                disconnected.set()
+
+        scope = {'type': 'http', 'path': '/api/stream/leaderboard/', 'query_string': b'n=10'}
+        await asyncio.wait_for(leaderboard_stream(scope, receive, send), 5)
+        self.assertTrue(bodies[0].startswith('event: snapshot\n'))
+        self.assertIn('"username": "thor"', bodies[0])
+        self.assertTrue(bodies[1].startswith('event: score\n'))
+        self.assertFalse(feed)
+
+    def _insert_elsewhere(self):
+        # A raw, settled insert with no signals, as another process's write
+        # looks to this one.
+        document = changes.stamp([{'username': 'loki', 'activity_type': 'scheming', 'duration': 5.0,
+                                   'date': datetime(2024, 1, 10)}])[0]
+        document['updated_at'] -= timedelta(seconds=5)
+        Activity.objects.mongo_insert_one(document)
+
+    async def test_sse_sends_activities_written_by_other_processes(self):
+        bodies = []
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] != 'http.response.body' or not message['body']:
+                return
+            bodies.append(message['body'].decode())
+            if len(bodies) == 1:
+                await sync_to_async(self._insert_elsewhere)()
+            else:
+                disconnected.set()
+
+        scope = {'type': 'http', 'path': '/api/stream/leaderboard/', 'query_string': b'n=10'}
+        with self.settings(OCTOFIT_FEED_POLL_SECONDS=0.05):
+            await asyncio.wait_for(leaderboard_stream(scope, receive, send), 5)
+        self.assertTrue(bodies[1].startswith('event: activity\n'))
+        self.assertIn('"username": "loki"', bodies[1])
+        self.assertFalse(feed)
+
+
+class ConditionalRequestTest(SimpleTestCase):
+    def test_if_modified_since(self):
+        factory = RequestFactory()
+        request = factory.get('/', HTTP_IF_MODIFIED_SINCE='Wed, 10 Jan 2024 00:00:00 GMT')
+        self.assertTrue(not_modified_since(request, 1704844800))
+        self.assertFalse(not_modified_since(request, 1704844801))
+        self.assertFalse(not_modified_since(request, None))
+        # If-None-Match takes precedence.
+        request = factory.get('/', HTTP_IF_MODIFIED_SINCE='Wed, 10 Jan 2024 00:00:00 GMT', HTTP_IF_NONE_MATCH='"x"')
+        self.assertFalse(not_modified_since(request, 1704844800))
+
+    def test_stamp_update_keeps_existing_set(self):
+        now = datetime(2024, 1, 10)
+        self.assertEqual(changes.stamp_update({'$set': {'score': 0}, '$inc': {'calories': 1}}, 7, now), {
+            '$set': {'score': 0, 'change_seq': 7, 'updated_at': now},
+            '$inc': {'calories': 1},
+        })
+
+
+@mock.patch.object(changes, 'SETTLE_SECONDS', 0)
+class DeltaSyncTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.kept = Workout.objects.create(name='Gotham Night Patrol', description='Stealth', exercises=[])
+        self.removed = Workout.objects.create(name='Speed Force Intervals', description='Sprints', exercises=[])
+
+    def tearDown(self):
+        Workout.objects.all().delete()
+        Tombstone.objects.mongo_delete_many({})
+
+    def test_writes_are_stamped(self):
+        self.kept.refresh_from_db()
+        self.removed.refresh_from_db()
+        self.assertGreater(self.removed.change_seq, self.kept.change_seq)
+        self.assertIsNotNone(self.kept.updated_at)
+
+    def test_delta_returns_changes_and_deletions_after_token(self):
+        response = self.client.get('/api/workouts/?since=0&page_size=1')
+        self.assertEqual([workout['name'] for workout in response.data['results']], ['Gotham Night Patrol'])
+        self.assertTrue(response.data['more'])
+        response = self.client.get(f"/api/workouts/?since={response.data['token']}")
+        self.assertEqual([workout['name'] for workout in response.data['results']], ['Speed Force Intervals'])
+        self.assertFalse(response.data['more'])
+        token = response.data['token']
+
+        self.client.patch(f'/api/workouts/{self.kept._id}/', {'name': 'Dark Knight Patrol'}, format='json')
+        self.client.delete(f'/api/workouts/{self.removed._id}/')
+        response = self.client.get(f'/api/workouts/?since={token}&fields=name')
+        self.assertEqual(response.data['results'], [{'_id': str(self.kept._id), 'name': 'Dark Knight Patrol'}])
+        self.assertEqual(response.data['deleted'], [str(self.removed._id)])
+
+        response = self.client.get(f"/api/workouts/?since={response.data['token']}")
+        self.assertEqual((response.data['results'], response.data['deleted']), ([], []))
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertEqual(self.client.get('/api/workouts/?since=abc').status_code, status.HTTP_400_BAD_REQUEST)
+        token = self.client.get('/api/workouts/?since=0').data['token']
+        self.removed.delete()
+        changes.prune(datetime(2100, 1, 1))
+        self.assertEqual(self.client.get(f'/api/workouts/?since={token}').status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.client.get('/api/workouts/?since=0').status_code, status.HTTP_200_OK)
+
+    def test_last_modified_and_if_modified_since(self):
+        # Settled changes: kept an hour ago, removed a minute ago.
+        for workout, age in ((self.kept, 3600), (self.removed, 60)):
+            Workout.objects.mongo_update_one(
+                {'_id': workout._id}, {'$set': {'updated_at': timezone.now() - timedelta(seconds=age)}}
+            )
+        object_cache.clear()
+        response = self.client.get('/api/workouts/')
+        last_modified = response['Last-Modified']
+        response = self.client.get('/api/workouts/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        detail = f'/api/workouts/{self.kept._id}/'
+        kept_modified = self.client.get(detail)['Last-Modified']
+        self.assertLess(parse_http_date(kept_modified), parse_http_date(last_modified))
+        # A later write to another workout leaves this one's validator alone.
+        response = self.client.get(detail, HTTP_IF_MODIFIED_SINCE=kept_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get('/api/workouts/', HTTP_IF_MODIFIED_SINCE=kept_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_document_last_modified_needs_no_query(self):
+        settled = timezone.now() - timedelta(minutes=5)
+        self.assertEqual(changes.document_last_modified({'updated_at': settled.replace(tzinfo=None)}),
+                         settled)
+        self.assertIsNone(changes.document_last_modified({'updated_at': timezone.now()}))
+        self.assertIsNone(changes.document_last_modified({}))
+
+
+def _worker_task(partition, parent):
+    # A jobs task: counts the partitions that ran outside the test process.
+    return int(os.getpid() != parent)
+
+
+class JobPlanningTest(SimpleTestCase):
+    def test_index_ranges_cover_every_slot_once(self):
+        self.assertEqual(jobs.index_ranges(10, 4), [[0, 3], [3, 6], [6, 9], [9, 10]])
+        self.assertEqual(jobs.index_ranges(2, 8), [[0, 1], [1, 2]])
+        self.assertEqual(jobs.index_ranges(0, 4), [])
+
+    def test_sampled_ranges_are_open_ended(self):
+        self.assertEqual(jobs.ranges_from_sample(list('abcdefgh'), 4),
+                         [[None, 'c'], ['c', 'e'], ['e', 'g'], ['g', None]])
+        self.assertEqual(jobs.ranges_from_sample([], 4), [[None, None]])
+
+    def test_range_match(self):
+        self.assertEqual(jobs.range_match('username', ['c', None]), {'username': {'$gte': 'c'}})
+        self.assertEqual(jobs.range_match('username', [None, None]), {})
+
+    def test_spawned_workers_set_django_up(self):
+        with jobs.executor(2) as pool:
+            results = list(pool.map(_worker_task, [[0, 1], [1, 2]], [os.getpid()] * 2))
+        self.assertEqual(results, [1, 1])
+
+
+class PartitionedJobTest(TestCase):
+    def setUp(self):
+        for username, duration in (('blackwidow', 40.0), ('loki', 3.0), ('thor', 12.5)):
+            Activity.objects.create(username=username, activity_type='flying', duration=duration, date=date(2024, 1, 14))
+        Leaderboard.objects.mongo_update_many({}, {'$set': {'score': 0, 'calories': 0}})
+
+    def tearDown(self):
+        Activity.objects.all().delete()
+        Leaderboard.objects.all().delete()
+        JobCheckpoint.objects.mongo_delete_many({})
+
+    def test_workers_rebuild_the_same_rows(self):
+        out = StringIO()
+        self.assertEqual(leaderboard.rebuild(workers=2, stdout=out), 3)
+        self.assertEqual(Leaderboard.objects.get(username='thor').score, 125)
+        self.assertEqual(Leaderboard.objects.get(username='blackwidow').score, 400)
+        self.assertIn('partitions', out.getvalue())
+        self.assertFalse(JobCheckpoint.objects.mongo_find_one({'name': 'rebuild_leaderboard'}))
+
+    def test_partitions_run_in_worker_processes(self):
+        total = jobs.run('worker_check', _worker_task, lambda: jobs.index_ranges(4, 4), workers=2, parent=os.getpid())
+        self.assertEqual(total, 4)
+
+    def test_resume_skips_finished_partitions(self):
+        JobCheckpoint.objects.mongo_insert_one({
+            'name': 'rebuild_leaderboard',
+            'options': {'batch_size': 1000, 'use_rollups': False},
+            'partitions': [[None, 'm'], ['m', None]],
+            'results': {'0': 1},
+            'started_at': datetime(2024, 1, 14),
+        })
+        self.assertEqual(leaderboard.rebuild(resume=True), 2)
+        self.assertEqual(Leaderboard.objects.get(username='thor').score, 125)
+        self.assertEqual(Leaderboard.objects.get(username='blackwidow').score, 0)
+
+
+class SearchTermsTest(SimpleTestCase):
+    def test_terms_are_normalized_words(self):
+        self.assertEqual(search.tokenize('Café-Sprint  INTERVALS'), ['cafe', 'sprint', 'intervals'])
+        workout = Workout(name='Speed Force Intervals', description='Sprint, sprint.',
+                          exercises=['rapid interval sprints'])
+        search.index_instance(workout)
+        self.assertEqual(workout.search_terms,
+                         ['force', 'interval', 'intervals', 'rapid', 'speed', 'sprint', 'sprints'])
+
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(search.build_query('Speed in'),
+                         {'$and': [{'search_terms': 'speed'},
+                                   {'search_terms': {'$elemMatch': {'$gte': 'in', '$lt': 'io'}}}]})
+        self.assertIsNone(search.build_query(' - '))
+
+
+class SearchEndpointTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Workout.objects.create(name='Speed Force Intervals', description='Sprints', exercises=['rapid interval sprints'])
+        Workout.objects.create(name='Gotham Night Patrol', description='Stealth', exercises=['grappling hook pull-ups'])
+        User.objects.create(username='theflash', name='Barry Allen', email='barry@allen.com', password='speedforce')
+
+    def tearDown(self):
+        Workout.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_prefix_search(self):
+        response = self.client.get('/api/workouts/search/?q=speed%20int&fields=name')
+        self.assertEqual([workout['name'] for workout in response.data], ['Speed Force Intervals'])
+        response = self.client.get('/api/users/search/?q=bar')
+        self.assertEqual([user['username'] for user in response.data], ['theflash'])
+
+    def test_edits_update_the_terms(self):
+        workout = Workout.objects.get(name='Gotham Night Patrol')
+        workout.name = 'Batcave Circuit'
+        workout.save()
+        self.assertEqual(self.client.get('/api/workouts/search/?q=gotham').data, [])
+        self.assertEqual(len(self.client.get('/api/workouts/search/?q=batc').data), 1)
+
+    def test_empty_query_is_rejected(self):
+        self.assertEqual(self.client.get('/api/workouts/search/?q=').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_admin_changelist_uses_the_index(self):
+        from django.contrib import admin as django_admin
+        model_admin = django_admin.site._registry[Workout]
+        queryset, _ = model_admin.get_search_results(None, Workout.objects.all(), 'grappl')
+        self.assertEqual([workout.name for workout in queryset], ['Gotham Night Patrol'])
+
+
+class ObjectCacheTest(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ObjectCache(max_entries=2, ttl=60)
+        first, second, third = ObjectId(), ObjectId(), ObjectId()
+        for object_id in (first, second):
+            cache.get(Workout, object_id, lambda: {'_id': object_id})
+        cache.get(Workout, first, lambda: self.fail('should be cached'))
+        cache.get(Workout, third, lambda: {'_id': third})
+        self.assertEqual(cache.get(Workout, first, lambda: None), {'_id': first})
+        self.assertIsNone(cache.get(Workout, second, lambda: None))
+        stats = cache.snapshot()['workouts']
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['size']), (2, 4, 1, 2))
+
+    def test_expired_and_invalidated_entries_are_reloaded(self):
+        cache = ObjectCache(max_entries=10, ttl=0)
+        object_id = ObjectId()
+        cache.get(User, object_id, lambda: {'name': 'old'})
+        self.assertEqual(cache.get(User, object_id, lambda: {'name': 'new'}), {'name': 'new'})
+        self.assertEqual(cache.snapshot()['users']['expirations'], 1)
+
+        cache.ttl = 60
+        cache.invalidate(User, object_id)
+        cache.get(User, object_id, lambda: {'name': 'v1'})
+        cache.invalidate(User)
+        self.assertEqual(cache.get(User, object_id, lambda: {'name': 'v2'}), {'name': 'v2'})
+        self.assertEqual(cache.snapshot()['users']['invalidations'], 2)
+
+    def test_load_racing_an_invalidation_is_not_cached(self):
+        cache = ObjectCache(max_entries=10, ttl=60)
+        object_id = ObjectId()
+
+        def load():
+            cache.invalidate(User, object_id)
+            return {'name': 'stale'}
+
+        cache.get(User, object_id, load)
+        self.assertEqual(cache.get(User, object_id, lambda: {'name': 'fresh'}), {'name': 'fresh'})
+
+    def test_instances_are_built_like_djongo_loads_them(self):
+        document = {'_id': ObjectId(), 'username': 'thor', 'activity_type': 'flying', 'duration': 10.0,
+                    'date': datetime(2024, 1, 14)}
+        activity = instance_from_document(Activity, document)
+        self.assertEqual((activity.date, activity.change_seq), (date(2024, 1, 14), None))
+        self.assertFalse(activity._state.adding)
+        entry = instance_from_document(Leaderboard, {'_id': ObjectId(), 'username': 'thor', 'score': 5})
+        self.assertEqual(entry.calories, 0)
+
+
+class HotObjectCacheTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.workout = Workout.objects.create(name='Gotham Night Patrol', description='Stealth', exercises=['pull-ups'])
+        object_cache.clear()
+
+    def tearDown(self):
+        Workout.objects.all().delete()
+
+    def _hits(self):
+        return object_cache.snapshot().get('workouts', {}).get('hits', 0)
+
+    def test_repeated_retrieve_is_a_hit(self):
+        url = f'/api/workouts/{self.workout._id}/?fields=name'
+        self.client.get(url)
+        hits = self._hits()
+        response = self.client.get(f'/api/workouts/{self.workout._id}/')
+        self.assertEqual(response.data, dict(WorkoutSerializer(self.workout).data))
+        self.assertEqual(self._hits(), hits + 1)
+
+    def test_writes_invalidate_and_use_the_cached_object(self):
+        url = f'/api/workouts/{self.workout._id}/'
+        self.client.get(url)
+        response = self.client.patch(url, {'name': 'Batcave Circuit'}, format='json')
+        self.assertEqual(response.data['exercises'], ['pull-ups'])
+        self.assertEqual(self.client.get(url).data['name'], 'Batcave Circuit')
+        self.client.delete(url)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_does_not_undo_other_workers_writes(self):
+        url = f'/api/workouts/{self.workout._id}/'
+        self.client.get(url)
+        # Another worker's write leaves this process's cached copy stale.
+        Workout.objects.mongo_update_one({'_id': self.workout._id}, {'$set': {'description': 'Sonar'}})
+        response = self.client.patch(url, {'name': 'Batcave Circuit'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        stored = Workout.objects.mongo_find_one({'_id': self.workout._id})
+        self.assertEqual((stored['name'], stored['description']), ('Batcave Circuit', 'Sonar'))
@@ -17,8 +17,10 @@ import os
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
+from .metrics import metrics_view
 from .views import (
-    api_root, UserViewSet, TeamViewSet, ActivityViewSet,
+    api_root, pool_stats, object_cache_stats, UserViewSet, TeamViewSet, ActivityViewSet,
     LeaderboardViewSet, WorkoutViewSet
 )
 
@@ -41,5 +43,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', api_root, name='api-root'),
     path('api/', api_root, name='api-root-prefix'),
+    path('api/pool/', pool_stats, name='pool-stats'),
+    path('api/object-cache/', object_cache_stats, name='object-cache-stats'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include(router.urls)),
+    path('api/async/<str:resource>/', async_views.document_list, name='async-list'),
+    path('api/async/<str:resource>/<str:pk>/', async_views.document_detail, name='async-detail'),
 ]
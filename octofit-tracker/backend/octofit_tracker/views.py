@@ -1,14 +1,26 @@
-from rest_framework import viewsets
-from rest_framework.decorators import api_view
+from rest_framework import status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import APIException, NotFound, ValidationError
 import os
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.http import http_date
 from bson import ObjectId
 from bson.errors import InvalidId
+from .caching import CachedResponseMixin, not_modified_since
+from .filters import ActivityFilter, HistoryOrderingFilter, date_param
 from .models import User, Team, Activity, Leaderboard, Workout
+from .parsers import NDJSONParser
+from .pool import pool_metrics
+from .ranking import ranking
+from .renderers import CSVRenderer, NDJSONRenderer
+from .export import stream_activities
+from . import changes, ingest, objectcache, repository, search, stats
 from .serializers import (
     UserSerializer, TeamSerializer, ActivitySerializer,
-    LeaderboardSerializer, WorkoutSerializer
+    LeaderboardSerializer, WorkoutSerializer, _parse_list_field, expand_members
 )
 
 
@@ -29,40 +41,317 @@ def api_root(request):
     })
 
 
+@api_view(['GET'])
+def pool_stats(request):
+    """Connection pool counters of this worker process, keyed by server."""
+    return Response(pool_metrics.snapshot())
+
+
+@api_view(['GET'])
+def object_cache_stats(request):
+    """Hot-object cache counters of this worker process, keyed by collection."""
+    return Response(objectcache.object_cache.snapshot())
+
+
 class ObjectIdLookupMixin:
-    """Override get_object to support lookup by the MongoDB _id string."""
+    """Look objects up by the MongoDB _id string with one ``find_one``.
+
+    Used by update and delete, which always read a fresh copy: djongo saves
+    the whole document back, so a cached copy would undo writes other
+    workers made since it was loaded. No viewset narrows its queryset for
+    detail routes, so the queryset filters are not applied.
+    """
 
     def get_object(self):
-        queryset = self.filter_queryset(self.get_queryset())
-        pk = self.kwargs.get('pk')
+        model = self.queryset.model
         try:
-            obj = queryset.get(_id=ObjectId(pk))
-        except (InvalidId, self.queryset.model.DoesNotExist):
+            object_id = ObjectId(self.kwargs.get('pk'))
+        except (InvalidId, TypeError):
             raise NotFound()
+        document = model.objects.mongo_find_one({'_id': object_id})
+        if document is None:
+            raise NotFound()
+        obj = objectcache.instance_from_document(model, document)
         self.check_object_permissions(self.request, obj)
         return obj
 
 
-class UserViewSet(ObjectIdLookupMixin, viewsets.ModelViewSet):
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'This sync token has expired; sync again from since=0.'
+    default_code = 'sync_token_expired'
+
+
+class RepositoryReadMixin:
+    """Serve ``list`` and ``retrieve`` through ``repository`` instead of djongo.
+
+    Both return the same JSON as the serializer; create, update and delete
+    still go through the ORM. ``?fields=name,score`` limits the response,
+    and the MongoDB projection, to those fields plus ``_id``. The list also
+    reads the fields it is ordered by, for the pagination cursor, and drops
+    them again before responding.
+
+    ``?since=<token>`` turns the list into a delta: the documents changed
+    and the ids deleted after ``token``, in pages of ``page_size``, with the
+    token for the next request; see ``changes.py``. Start with ``since=0``.
+    Responses carry ``Last-Modified`` and honour If-Modified-Since: the
+    collection's for the list, the document's own ``updated_at`` for
+    retrieve, which therefore costs no query on an object cache hit.
+    """
+
+    def get_repository(self):
+        documents = repository.for_model(self.queryset.model)
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return documents
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = set(fields) - set(documents.field_names)
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        return documents.only(fields)
+
+    def requested_documents(self, documents):
+        """Drop the fields that were only read to order ``documents``."""
+        fields = self.get_repository().field_names
+        for document in documents:
+            for name in [name for name in document if name not in fields]:
+                del document[name]
+        return documents
+
+    def get_documents(self):
+        return self.get_repository().all()
+
+    def get_since(self):
+        value = self.request.query_params.get('since')
+        if value is None:
+            return None
+        try:
+            since = int(value)
+        except ValueError:
+            since = -1
+        if since < 0:
+            raise ValidationError({'since': 'Expected the token of an earlier sync, or 0.'})
+        if since and since < changes.floor():
+            raise SyncTokenExpired()
+        return since
+
+    def prepare_documents(self, documents):
+        """Adjust encoded documents in place before they are returned."""
+        return documents
+
+    def conditional_response(self, request, last_modified, build):
+        """Return ``build()`` with Last-Modified, or 304 if the client is current."""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        headers = {'Last-Modified': http_date(timestamp)} if timestamp else {}
+        if not_modified_since(request, timestamp):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response = build()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        since = self.get_since()
+        last_modified = changes.last_modified(self.queryset.model)
+        return self.conditional_response(request, last_modified, lambda: self._list(request, since))
+
+    def _list(self, request, since):
+        documents = self.filter_queryset(self.get_documents())
+        if since is not None:
+            delta = changes.delta(documents, since, self.paginator.get_page_size(request))
+            delta['results'] = self.prepare_documents(self.requested_documents(delta['results']))
+            return Response(delta)
+        page = self.paginate_queryset(documents)
+        if page is not None:
+            response = self.get_paginated_response(self.prepare_documents(page))
+            # The cursor links are built from the page's sort keys first.
+            self.requested_documents(response.data['results'])
+            return response
+        return Response(self.prepare_documents(self.requested_documents(list(documents))))
+
+    def retrieve(self, request, *args, **kwargs):
+        documents = self.get_repository()
+        document = documents.lookup(self.kwargs.get('pk'))
+        if document is None:
+            raise NotFound()
+        return self.conditional_response(
+            request, changes.document_last_modified(document), lambda: self._retrieve(request, documents, document)
+        )
+
+    def _retrieve(self, request, documents, document):
+        document = documents.encode(document)
+        self.check_object_permissions(request, document)
+        return Response(self.prepare_documents([document])[0])
+
+
+class SearchMixin:
+    """``search/?q=`` over the fields in ``search.SEARCH_FIELDS``.
+
+    The last word of ``q`` matches as a prefix, for autocomplete. Takes
+    ``?limit=`` (default 20, at most 100) and ``?fields=``.
+    """
+
+    @action(detail=False, url_path='search')
+    def search(self, request):
+        text = request.query_params.get('q', '')
+        if not search.tokenize(text):
+            raise ValidationError({'q': 'Expected at least one word to search for.'})
+        try:
+            limit = int(request.query_params.get('limit', search.DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer.'})
+        limit = max(1, min(limit, search.MAX_LIMIT))
+        return Response(search.search(self.get_repository(), text, limit))
+
+
+class UserViewSet(SearchMixin, RepositoryReadMixin, ObjectIdLookupMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
 
-class TeamViewSet(ObjectIdLookupMixin, viewsets.ModelViewSet):
+def _resolve_members(member_lists, chunk_size=1000):
+    """Map every username in ``member_lists`` to its public user fields.
+
+    Usernames are looked up with batched ``$in`` queries of ``chunk_size``
+    so teams with thousands of members never build one huge query.
+    """
+    usernames = sorted({
+        username for members in member_lists for username in _parse_list_field(members)
+    })
+    members = {}
+    for start in range(0, len(usernames), chunk_size):
+        cursor = User.objects.mongo_find(
+            {'username': {'$in': usernames[start:start + chunk_size]}},
+            {'username': 1, 'name': 1, 'email': 1},
+            batch_size=chunk_size,
+        )
+        for user in cursor:
+            members[user['username']] = {
+                '_id': str(user['_id']),
+                'username': user['username'],
+                'name': user.get('name', ''),
+                'email': user.get('email'),
+            }
+    return members
+
+
+class TeamViewSet(CachedResponseMixin, RepositoryReadMixin, ObjectIdLookupMixin, viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
 
+    def _expand_members(self):
+        return 'members' in self.request.query_params.get('expand', '').split(',')
+
+    def prepare_documents(self, documents):
+        if self._expand_members():
+            documents_with_members = [document for document in documents if 'members' in document]
+            expanded = _resolve_members(document['members'] for document in documents_with_members)
+            for document in documents_with_members:
+                document['members'] = expand_members(document['members'], expanded)
+        return documents
+
+    def get_serializer(self, *args, **kwargs):
+        # Write responses still come from the serializer.
+        if args and self._expand_members():
+            instance = args[0]
+            teams = instance if isinstance(instance, (list, tuple)) else [instance]
+            context = self.get_serializer_context()
+            context['expanded_members'] = _resolve_members(team.members for team in teams)
+            kwargs['context'] = context
+        return super().get_serializer(*args, **kwargs)
+
+
+class ActivityViewSet(RepositoryReadMixin, ObjectIdLookupMixin, viewsets.ModelViewSet):
+    """Activities.
+
+    The list takes ``?username=``, ``?activity_type=``, ``?date_from=``,
+    ``?date_to=`` and ``?ordering=[-]date|[-]duration``; see ``filters.py``.
+    """
 
-class ActivityViewSet(ObjectIdLookupMixin, viewsets.ModelViewSet):
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    filter_backends = [ActivityFilter, HistoryOrderingFilter]
+    ordering_fields = ['date', 'duration']
+    ordering = ['_id']
+    filtered_ordering = ['-date']
+
+    def filter_queryset(self, queryset):
+        # Only the list reads through DocumentQuery; detail routes look
+        # objects up by _id.
+        if self.action != 'list':
+            return queryset
+        return super().filter_queryset(queryset)
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=settings.OCTOFIT_BULK_MAX_ITEMS
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        inserted, write_errors = ingest.insert_activities(serializer.valid_items)
+        failures = {**serializer.item_errors, **write_errors}
+        errors = [{'index': index, 'errors': failures[index]} for index in sorted(failures)]
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif inserted:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'inserted': len(inserted), 'errors': errors}, status=response_status)
 
+    @action(detail=False, url_path='export', renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        export_format = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            stream_activities(export_format, since=date_param(request, 'since')),
+            content_type=request.accepted_renderer.media_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="activities.{export_format}"'
+        return response
 
-class LeaderboardViewSet(ObjectIdLookupMixin, viewsets.ModelViewSet):
+    @action(detail=False, url_path='stats')
+    def stats(self, request):
+        group_by = request.query_params.get('group_by')
+        group_by = tuple(group_by.split(',')) if group_by else stats.GROUP_FIELDS
+        unknown = set(group_by) - set(stats.GROUP_FIELDS)
+        if unknown:
+            raise ValidationError({'group_by': f"Unknown field(s): {', '.join(sorted(unknown))}."})
+        bucket = request.query_params.get('bucket')
+        if bucket and bucket not in stats.BUCKET_FORMATS:
+            raise ValidationError({'bucket': f"Expected one of: {', '.join(stats.BUCKET_FORMATS)}."})
+        return Response(stats.activity_stats(
+            group_by=group_by,
+            bucket=bucket,
+            date_from=date_param(request, 'date_from'),
+            date_to=date_param(request, 'date_to'),
+            username=request.query_params.get('username'),
+        ))
+
+
+class LeaderboardViewSet(CachedResponseMixin, RepositoryReadMixin, ObjectIdLookupMixin, viewsets.ModelViewSet):
     queryset = Leaderboard.objects.all()
     serializer_class = LeaderboardSerializer
+    max_top = 100
+
+    @action(detail=False, url_path='top')
+    def top(self, request):
+        try:
+            n = int(request.query_params.get('n', 10))
+        except ValueError:
+            raise ValidationError({'n': 'Expected an integer.'})
+        n = max(1, min(n, self.max_top))
+        return Response(ranking.top(n))
+
+    @action(detail=False, url_path=r'rank/(?P<username>[^/.]+)')
+    def rank(self, request, username=None):
+        row = ranking.rank(username)
+        if row is None:
+            raise NotFound()
+        return Response(row)
 
 
-class WorkoutViewSet(ObjectIdLookupMixin, viewsets.ModelViewSet):
+class WorkoutViewSet(SearchMixin, CachedResponseMixin, RepositoryReadMixin, ObjectIdLookupMixin, viewsets.ModelViewSet):
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
@@ -0,0 +1,14 @@
+"""Start-up of the ``jobs`` worker processes.
+
+Workers are spawned, so each one unpickles the pool initializer before
+Django is set up. This module is that initializer's home and must therefore
+import nothing that touches the app registry, such as models.
+"""
+import django
+from django.conf import settings
+
+
+def init(databases):
+    """Set Django up with the parent's ``DATABASES``."""
+    settings.DATABASES = databases
+    django.setup()
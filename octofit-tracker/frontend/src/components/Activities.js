@@ -1,13 +1,21 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
+
+// Replaces a changed activity in place; new ones go first.
+const upsert = (rows, activity) => (
+  rows.some((row) => row._id === activity._id)
+    ? rows.map((row) => (row._id === activity._id ? activity : row))
+    : [activity, ...rows]
+);
 
 function Activities() {
   const [activities, setActivities] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/activities/`;
+  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/activities/?fields=username,activity_type,duration,date`;
+  const streamUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/stream/leaderboard/?n=1`;
 
-  useEffect(() => {
+  const load = useCallback(() => {
     console.log('Activities: fetching from', apiUrl);
     fetch(apiUrl)
       .then((res) => {
@@ -27,6 +35,23 @@ function Activities() {
       });
   }, [apiUrl]);
 
+  useEffect(() => {
+    load();
+  }, [load]);
+
+  // Activities written through any server process arrive over the
+  // leaderboard stream; a resync means some were dropped, so fetch again.
+  useEffect(() => {
+    if (!window.EventSource) return undefined;
+    const source = new EventSource(streamUrl);
+    source.addEventListener('activity', (e) => {
+      const { activity } = JSON.parse(e.data);
+      setActivities((rows) => upsert(rows, activity));
+    });
+    source.addEventListener('resync', load);
+    return () => source.close();
+  }, [streamUrl, load]);
+
   if (loading) return (
     <div className="container mt-4">
       <div className="card octofit-card">
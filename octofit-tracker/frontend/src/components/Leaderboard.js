@@ -1,11 +1,29 @@
 import React, { useState, useEffect } from 'react';
 
+const TOP_N = 100;
+
+// Re-ranks rows after a live score change; tied scores share a rank.
+const applyScore = (rows, change) => {
+  const sorted = [
+    ...rows.filter((row) => row.username !== change.username),
+    { username: change.username, score: change.score, calories: change.calories },
+  ]
+    .sort((a, b) => b.score - a.score || (a.username < b.username ? -1 : 1))
+    .slice(0, TOP_N);
+  let rank = 0;
+  return sorted.map((row, idx) => {
+    if (idx === 0 || sorted[idx - 1].score !== row.score) rank = idx + 1;
+    return { ...row, rank };
+  });
+};
+
 function Leaderboard() {
   const [entries, setEntries] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard/`;
+  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard/top/?n=${TOP_N}`;
+  const streamUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/stream/leaderboard/?n=${TOP_N}`;
 
   useEffect(() => {
     console.log('Leaderboard: fetching from', apiUrl);
@@ -27,6 +45,24 @@ function Leaderboard() {
       });
   }, [apiUrl]);
 
+  // Live updates: the stream starts with a snapshot and then sends only
+  // changed rows, so the list is never re-fetched while the tab is open.
+  useEffect(() => {
+    if (!window.EventSource) return undefined;
+    let source;
+    const connect = () => {
+      source = new EventSource(streamUrl);
+      source.addEventListener('snapshot', (e) => setEntries(JSON.parse(e.data).top));
+      source.addEventListener('score', (e) => setEntries((rows) => applyScore(rows, JSON.parse(e.data))));
+      source.addEventListener('resync', () => {
+        source.close();
+        connect();
+      });
+    };
+    connect();
+    return () => source.close();
+  }, [streamUrl]);
+
   const medal = (rank) => {
     if (rank === 1) return '🥇';
     if (rank === 2) return '🥈';
@@ -72,8 +108,8 @@ function Leaderboard() {
               </thead>
               <tbody>
                 {entries.map((entry, idx) => (
-                  <tr key={entry._id || idx} className={idx === 0 ? 'table-warning fw-bold' : ''}>
-                    <td style={{ fontSize: '1.2rem' }}>{medal(idx + 1)}</td>
+                  <tr key={entry.username || idx} className={entry.rank === 1 ? 'table-warning fw-bold' : ''}>
+                    <td style={{ fontSize: '1.2rem' }}>{medal(entry.rank ?? idx + 1)}</td>
                     <td><span className="fw-semibold">{entry.username}</span></td>
                     <td><span className="badge bg-success fs-6">{entry.score}</span></td>
                     <td><span className="badge bg-warning text-dark fs-6">🔥 {entry.calories ?? '—'} kcal</span></td>
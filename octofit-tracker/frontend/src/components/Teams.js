@@ -5,7 +5,7 @@ function Teams() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/teams/`;
+  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/teams/?fields=name,members`;
 
   useEffect(() => {
     console.log('Teams: fetching from', apiUrl);
@@ -23,8 +23,8 @@ function Users() {
     console.log('Users: fetching from', apiUrl);
     console.log('Teams: fetching from', teamsApiUrl);
     Promise.all([
-      fetch(apiUrl).then(r => { if (!r.ok) throw new Error(`Users: HTTP ${r.status}`); return r.json(); }),
-      fetch(teamsApiUrl).then(r => { if (!r.ok) throw new Error(`Teams: HTTP ${r.status}`); return r.json(); }),
+      fetch(`${apiUrl}?fields=username,name,email`).then(r => { if (!r.ok) throw new Error(`Users: HTTP ${r.status}`); return r.json(); }),
+      fetch(`${teamsApiUrl}?fields=name,members`).then(r => { if (!r.ok) throw new Error(`Teams: HTTP ${r.status}`); return r.json(); }),
     ])
       .then(([usersData, teamsData]) => {
         console.log('Users: fetched data', usersData);